@@ -0,0 +1,58 @@
+"""add job table
+
+Revision ID: 5c2f9a7d41be
+Revises: 0e47cbc0fec7
+Create Date: 2025-05-20 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5c2f9a7d41be"
+down_revision: Union[str, None] = "0e47cbc0fec7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "job",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(length=64), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("username", sa.String(length=50), nullable=False),
+        sa.Column("payload", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column("result", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("progress", sa.Float(), nullable=False),
+        sa.Column("progress_message", sa.String(length=255), nullable=True),
+        sa.Column("cancel_requested", sa.Boolean(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("worker_id", sa.String(length=64), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_job")),
+    )
+    op.create_index(op.f("ix_job_status"), "job", ["status"], unique=False)
+    op.create_index(op.f("ix_job_username"), "job", ["username"], unique=False)
+    op.create_index(
+        "ix_job_queued", "job", ["id"], unique=False,
+        postgresql_where=sa.text("status = 'queued'")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_job_queued", table_name="job", postgresql_where=sa.text("status = 'queued'"))
+    op.drop_index(op.f("ix_job_username"), table_name="job")
+    op.drop_index(op.f("ix_job_status"), table_name="job")
+    op.drop_table("job")
@@ -0,0 +1,54 @@
+"""add schedule exclusion constraints
+
+Revision ID: 8d3b6e0f2a71
+Revises: 5c2f9a7d41be
+Create Date: 2025-05-21 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8d3b6e0f2a71"
+down_revision: Union[str, None] = "5c2f9a7d41be"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Lesson time as a half-open range [start, end): lessons that only touch do not overlap
+LESSON_RANGE = "tsrange(date + start_time, date + end_time)"
+
+# (table, column) pairs that can not have overlapping lessons,
+# in the order the constraints are checked on insert
+EXCLUSION_CONSTRAINTS = [
+    ("practice_schedule", "instructor_id"),
+    ("practice_schedule", "vehicle_id"),
+    ("practice_schedule", "student_id"),
+    ("group_schedule", "cabinet_id"),
+    ("group_schedule", "group_id"),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Lets a gist index combine = on integer ids with && on ranges
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+
+    for table_name, column_name in EXCLUSION_CONSTRAINTS:
+        op.execute(f"""
+            ALTER TABLE {table_name}
+            ADD CONSTRAINT ex_{table_name}_{column_name}
+            EXCLUDE USING gist ({column_name} WITH =, {LESSON_RANGE} WITH &&)
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table_name, column_name in reversed(EXCLUSION_CONSTRAINTS):
+        op.drop_constraint(
+            constraint_name=f"ex_{table_name}_{column_name}",
+            table_name=table_name,
+        )
@@ -0,0 +1,54 @@
+"""add instructor conflict indexes
+
+Revision ID: a4c71e93d5f0
+Revises: 8d3b6e0f2a71
+Create Date: 2025-05-22 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4c71e93d5f0"
+down_revision: Union[str, None] = "8d3b6e0f2a71"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        op.f("ix_group_instructor_id"),
+        "group",
+        ["instructor_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_group_schedule_group_id_date",
+        "group_schedule",
+        ["group_id", "date", "start_time"],
+        unique=False,
+        postgresql_include=["end_time", "id"],
+    )
+    op.create_index(
+        "ix_practice_schedule_instructor_id_date",
+        "practice_schedule",
+        ["instructor_id", "date", "start_time"],
+        unique=False,
+        postgresql_include=["end_time", "id"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_practice_schedule_instructor_id_date", table_name="practice_schedule"
+    )
+    op.drop_index(
+        "ix_group_schedule_group_id_date", table_name="group_schedule"
+    )
+    op.drop_index(op.f("ix_group_instructor_id"), table_name="group")
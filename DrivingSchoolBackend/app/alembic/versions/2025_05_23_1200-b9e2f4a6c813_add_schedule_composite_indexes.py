@@ -0,0 +1,77 @@
+"""add schedule composite indexes
+
+Revision ID: b9e2f4a6c813
+Revises: a4c71e93d5f0
+Create Date: 2025-05-23 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b9e2f4a6c813"
+down_revision: Union[str, None] = "a4c71e93d5f0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Every hot schedule query filters by a resource and a date (or date range)
+COMPOSITE_INDEXES = [
+    ("ix_practice_schedule_vehicle_id_date", "practice_schedule", ["vehicle_id", "date", "start_time"]),
+    ("ix_practice_schedule_student_id_date", "practice_schedule", ["student_id", "date", "start_time"]),
+    ("ix_group_schedule_cabinet_id_date", "group_schedule", ["cabinet_id", "date", "start_time"]),
+]
+
+# Covered by the composite indexes (instructor / group ones are added in a4c71e93d5f0).
+# ix_group_schedule_date stays: lessons of an instructor are reached through group.instructor_id
+# and can only be range scanned by date
+SINGLE_COLUMN_INDEXES = [
+    ("ix_practice_schedule_date", "practice_schedule", ["date"]),
+    ("ix_practice_schedule_start_time", "practice_schedule", ["start_time"]),
+    ("ix_practice_schedule_end_time", "practice_schedule", ["end_time"]),
+    ("ix_group_schedule_start_time", "group_schedule", ["start_time"]),
+    ("ix_group_schedule_end_time", "group_schedule", ["end_time"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY does not lock the tables against writes, but can not run in a transaction.
+    # A failed build leaves an INVALID index behind, drop it before running the migration again
+    with op.get_context().autocommit_block():
+        for index_name, table_name, columns in COMPOSITE_INDEXES:
+            op.create_index(
+                index_name,
+                table_name,
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+            )
+        for index_name, table_name, columns in SINGLE_COLUMN_INDEXES:
+            op.drop_index(
+                index_name,
+                table_name=table_name,
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for index_name, table_name, columns in reversed(SINGLE_COLUMN_INDEXES):
+            op.create_index(
+                index_name,
+                table_name,
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+            )
+        for index_name, table_name, columns in reversed(COMPOSITE_INDEXES):
+            op.drop_index(
+                index_name,
+                table_name=table_name,
+                postgresql_concurrently=True,
+            )
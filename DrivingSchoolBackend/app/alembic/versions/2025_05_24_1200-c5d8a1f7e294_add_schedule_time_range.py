@@ -0,0 +1,96 @@
+"""add schedule time range
+
+Revision ID: c5d8a1f7e294
+Revises: b9e2f4a6c813
+Create Date: 2025-05-24 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c5d8a1f7e294"
+down_revision: Union[str, None] = "b9e2f4a6c813"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LESSON_RANGE = "tsrange(date + start_time, date + end_time)"
+
+# Same constraints as in 8d3b6e0f2a71, rebuilt over the stored column
+# so that "id = ? AND time_range && ?" queries can use their gist indexes
+EXCLUSION_CONSTRAINTS = [
+    ("practice_schedule", "instructor_id"),
+    ("practice_schedule", "vehicle_id"),
+    ("practice_schedule", "student_id"),
+    ("group_schedule", "cabinet_id"),
+    ("group_schedule", "group_id"),
+]
+
+# Conflict checks now go through the exclusion constraint indexes, the covered columns
+# of a4c71e93d5f0 are not needed for the remaining (resource id, date) reads
+COVERING_INDEXES = [
+    ("ix_group_schedule_group_id_date", "group_schedule", ["group_id", "date", "start_time"]),
+    ("ix_practice_schedule_instructor_id_date", "practice_schedule", ["instructor_id", "date", "start_time"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Adding a stored generated column rewrites the tables under an exclusive lock
+    for table_name in ("group_schedule", "practice_schedule"):
+        op.add_column(
+            table_name,
+            sa.Column(
+                "time_range",
+                postgresql.TSRANGE(),
+                sa.Computed(LESSON_RANGE, persisted=True),
+                nullable=True,
+            ),
+        )
+
+    for table_name, column_name in EXCLUSION_CONSTRAINTS:
+        op.drop_constraint(
+            constraint_name=f"ex_{table_name}_{column_name}",
+            table_name=table_name,
+        )
+        op.execute(f"""
+            ALTER TABLE {table_name}
+            ADD CONSTRAINT ex_{table_name}_{column_name}
+            EXCLUDE USING gist ({column_name} WITH =, time_range WITH &&)
+        """)
+
+    for index_name, table_name, columns in COVERING_INDEXES:
+        op.drop_index(index_name, table_name=table_name)
+        op.create_index(index_name, table_name, columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for index_name, table_name, columns in reversed(COVERING_INDEXES):
+        op.drop_index(index_name, table_name=table_name)
+        op.create_index(
+            index_name,
+            table_name,
+            columns,
+            unique=False,
+            postgresql_include=["end_time", "id"],
+        )
+
+    for table_name, column_name in reversed(EXCLUSION_CONSTRAINTS):
+        op.drop_constraint(
+            constraint_name=f"ex_{table_name}_{column_name}",
+            table_name=table_name,
+        )
+        op.execute(f"""
+            ALTER TABLE {table_name}
+            ADD CONSTRAINT ex_{table_name}_{column_name}
+            EXCLUDE USING gist ({column_name} WITH =, {LESSON_RANGE} WITH &&)
+        """)
+
+    for table_name in ("practice_schedule", "group_schedule"):
+        op.drop_column(table_name, "time_range")
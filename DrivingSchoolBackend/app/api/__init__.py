@@ -14,6 +14,8 @@ from .group_schedule import router as group_schedule_router
 from .practice_schedule import router as practice_schedule_router
 from .admin import router as admin_router
 from .statistics import router as statistics_router
+from .health import router as health_router
+from .jobs import router as jobs_router
 
 router = APIRouter(prefix=settings.api.prefix)
 router.include_router(test_router)
@@ -29,3 +31,5 @@ router.include_router(group_schedule_router)
 router.include_router(practice_schedule_router)
 router.include_router(admin_router)
 router.include_router(statistics_router)
+router.include_router(health_router)
+router.include_router(jobs_router)
@@ -1,17 +1,17 @@
 import json
 from tempfile import NamedTemporaryFile
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, Query
 from fastapi.responses import FileResponse
 from sqlalchemy.exc import ProgrammingError
 
+from api.jobs import accept_job
 from auth import user as auth_user
 from core.models import db_helper
 from core.schemas.admin import AdminUpdateSchema
 from core.schemas.profile import AdminProfileSchema
 from core.schemas.user import UserReadSchema
 from crud import admin as crud_admin
-from crud.data_management import load_initial_data, generate_test_data, get_export_data
 
 router = APIRouter(prefix="/admins", tags=["Admin"])
 
@@ -19,11 +19,17 @@ router = APIRouter(prefix="/admins", tags=["Admin"])
 @router.post("/load_data")
 async def load_seed_data(
     file: UploadFile,
+    background: bool = Query(False, description="Run as a job, answer 202 with the job id"),
     payload: dict = Depends(auth_user.get_current_token_payload)
 ):
     username = payload.get("username")
     password = payload.get("password")
 
+    if background:
+        return await accept_job("load_data", None, payload, upload=await file.read())
+
+    from crud.data_management import load_initial_data
+
     try:
         async for session in db_helper.user_pwd_session_getter(username, password):
             contents = await file.read()
@@ -35,11 +41,17 @@ async def load_seed_data(
 
 @router.post("/generate_data")
 async def generate_data_test(
+    background: bool = Query(False, description="Run as a job, answer 202 with the job id"),
     payload: dict = Depends(auth_user.get_current_token_payload)
 ):
     username = payload.get("username")
     password = payload.get("password")
 
+    if background:
+        return await accept_job("generate_data", None, payload)
+
+    from crud.data_management import generate_test_data
+
     try:
         async for session in db_helper.user_pwd_session_getter(username, password):
             return await generate_test_data(session)
@@ -54,6 +66,8 @@ async def export_groups(
     username = payload.get("username")
     password = payload.get("password")
 
+    from crud.data_management import get_export_data
+
     try:
         async for session in db_helper.user_pwd_session_getter(username, password):
             data = await get_export_data(session)
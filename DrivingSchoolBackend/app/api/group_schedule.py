@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Query
 from sqlalchemy.exc import ProgrammingError
 
 from core.models import db_helper
 from core.schemas.group_schedule import GroupScheduleReadSchema, GroupScheduleCreateSchema, GroupScheduleUpdateSchema, \
-    GroupScheduleButchCreateSchema
+    GroupScheduleButchCreateSchema, GroupScheduleSchoolButchCreateSchema, \
+    GroupScheduleValidateBatchSchema
+from core.schemas.schedule_validation import ScheduleValidationBatchResultSchema
 from crud import group_schedule as group_schedule_crud
+from api.jobs import accept_job
 from auth import user as auth_user
 
 router = APIRouter(prefix="/group_schedules", tags=["Group Schedules"])
@@ -25,6 +28,21 @@ async def create_schedule(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You have no permissions')
 
 
+@router.post("/validate_batch", response_model=ScheduleValidationBatchResultSchema)
+async def validate_schedules_batch(
+    data: GroupScheduleValidateBatchSchema,
+    payload: dict = Depends(auth_user.get_current_token_payload)
+):
+    username = payload.get("username")
+    password = payload.get("password")
+
+    try:
+        async for session in db_helper.user_pwd_session_getter(username, password):
+            return await group_schedule_crud.validate_group_schedules(session, data)
+    except ProgrammingError:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You have no permissions')
+
+
 @router.put("/{schedule_id}", response_model=GroupScheduleReadSchema)
 async def update_schedule(
     schedule_id: int,
@@ -87,15 +105,48 @@ async def get_all_by_group_id(
 
 @router.post("/create_butch")
 async def create_schedule_butch(
+    request: Request,
     data: GroupScheduleButchCreateSchema,
+    background: bool = Query(False, description="Run as a job, answer 202 with the job id"),
+    payload: dict = Depends(auth_user.get_current_token_payload)
+):
+    username = payload.get("username")
+    password = payload.get("password")
+
+    if background:
+        return await accept_job("group_schedules.create_butch", data.model_dump(mode="json"), payload)
+
+    try:
+        async for session in db_helper.user_pwd_session_getter(username, password):
+            return await group_schedule_crud.create_butch_group_schedules(
+                session, data, cancel_check=request.is_disconnected
+            )
+    except ProgrammingError:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You have no permissions')
+    except HTTPException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'{e}')
+
+
+@router.post("/create_butch_school")
+async def create_school_schedule_butch(
+    request: Request,
+    data: GroupScheduleSchoolButchCreateSchema,
+    background: bool = Query(False, description="Run as a job, answer 202 with the job id"),
     payload: dict = Depends(auth_user.get_current_token_payload)
 ):
     username = payload.get("username")
     password = payload.get("password")
 
+    if background:
+        return await accept_job("group_schedules.create_butch_school", data.model_dump(mode="json"), payload)
+
     try:
         async for session in db_helper.user_pwd_session_getter(username, password):
-            return await group_schedule_crud.create_butch_group_schedules(session, data)
+            return await group_schedule_crud.create_butch_school_group_schedules(
+                session, data, cancel_check=request.is_disconnected
+            )
     except ProgrammingError:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You have no permissions')
     except HTTPException as e:
@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
+
+from warmup import warmup_state
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+
+@router.get("/live")
+async def live():
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready():
+    if not warmup_state["done"]:
+        return ORJSONResponse(status_code=503, content={"status": "warming_up", "warmup": warmup_state})
+    if warmup_state["error"] is not None:
+        return ORJSONResponse(status_code=503, content={"status": "warmup_failed", "warmup": warmup_state})
+
+    return {"status": "ready", "warmup": warmup_state}
@@ -0,0 +1,102 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
+
+from auth import user as auth_user
+from core.config import settings
+from core.models import db_helper
+from core.schemas.job import JobReadSchema, JobAcceptedSchema
+from crud import job as job_crud
+from jobs.uploads import save_upload, remove_upload
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+# Enqueues an admin operation and answers 202 with links to poll its status and result.
+# An upload is stored outside the job table (it may hold credentials), the payload only names it
+async def accept_job(kind: str, payload: dict | None, token_payload: dict, upload: bytes | None = None):
+    if token_payload.get("role") != settings.roles.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You have no permissions')
+
+    username = token_payload.get("username")
+    async for session in db_helper.session_getter():
+        if not await job_crud.can_run_jobs_as(session, username):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Background jobs are not available: the application can not act with your role, "
+                       "run the operation without background"
+            )
+
+        upload_name = None
+        if upload is not None:
+            upload_name = save_upload(upload)
+            payload = {**(payload or {}), "upload": upload_name}
+        try:
+            job = await job_crud.enqueue_job(session, kind, payload, username)
+        except Exception:
+            remove_upload(upload_name)
+            raise
+
+    status_url = f"{settings.api.prefix}{router.prefix}/{job.id}"
+    return ORJSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=JobAcceptedSchema(
+            id=job.id,
+            status=job.status,
+            status_url=status_url,
+            result_url=f"{status_url}/result",
+        ).model_dump(),
+        headers={"Location": status_url},
+    )
+
+
+# Admins see every job, other users only their own
+def _owner_filter(payload: dict) -> str | None:
+    return None if payload.get("role") == settings.roles.admin else payload.get("username")
+
+
+@router.get("/", response_model=list[JobReadSchema])
+async def get_my_jobs(
+    payload: dict = Depends(auth_user.get_current_token_payload)
+):
+    async for session in db_helper.session_getter():
+        return await job_crud.get_jobs_by_username(session, payload.get("username"))
+
+
+@router.get("/{job_id}", response_model=JobReadSchema)
+async def get_job_status(
+    job_id: int,
+    payload: dict = Depends(auth_user.get_current_token_payload)
+):
+    async for session in db_helper.session_getter():
+        return await job_crud.get_job_by_id(session, job_id, _owner_filter(payload))
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(
+    job_id: int,
+    payload: dict = Depends(auth_user.get_current_token_payload)
+):
+    async for session in db_helper.session_getter():
+        job = await job_crud.get_job_by_id(session, job_id, _owner_filter(payload))
+
+        if job.status == "succeeded":
+            return job.result
+        if job.status == "failed":
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=job.error)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job.status}")
+
+
+@router.delete("/{job_id}", response_model=JobReadSchema)
+async def cancel_job(
+    job_id: int,
+    payload: dict = Depends(auth_user.get_current_token_payload)
+):
+    async for session in db_helper.session_getter():
+        job = await job_crud.get_job_by_id(session, job_id, _owner_filter(payload))
+        upload_name = (job.payload or {}).get("upload")
+
+        job = await job_crud.cancel_job(session, job_id, _owner_filter(payload))
+        # A running job removes its upload when the worker stops it
+        if job.status == "cancelled":
+            remove_upload(upload_name)
+        return job
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Query
 from sqlalchemy.exc import ProgrammingError
 
 from core.models import db_helper
 from core.schemas.practice_schedule import PracticeScheduleReadSchema, PracticeScheduleCreateSchema, \
-    PracticeScheduleUpdateSchema, PracticeScheduleButchCreateSchema
+    PracticeScheduleUpdateSchema, PracticeScheduleButchCreateSchema, PracticeScheduleGroupButchCreateSchema, \
+    PracticeScheduleValidateBatchSchema
+from core.schemas.schedule_validation import ScheduleValidationBatchResultSchema
 from crud import practice_schedule as practice_schedule_crud
+from api.jobs import accept_job
 from auth import user as auth_user
 
 router = APIRouter(prefix="/practice_schedules", tags=["Practice Schedules"])
@@ -25,6 +28,21 @@ async def create_schedule(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You have no permissions')
 
 
+@router.post("/validate_batch", response_model=ScheduleValidationBatchResultSchema)
+async def validate_schedules_batch(
+    data: PracticeScheduleValidateBatchSchema,
+    payload: dict = Depends(auth_user.get_current_token_payload)
+):
+    username = payload.get("username")
+    password = payload.get("password")
+
+    try:
+        async for session in db_helper.user_pwd_session_getter(username, password):
+            return await practice_schedule_crud.validate_practice_schedules(session, data)
+    except ProgrammingError:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You have no permissions')
+
+
 @router.put("/{schedule_id}", response_model=PracticeScheduleReadSchema)
 async def update_schedule(
     schedule_id: int,
@@ -87,15 +105,48 @@ async def get_all_by_student_id(
 
 @router.post("/create_butch")
 async def create_schedule_butch(
+    request: Request,
     data: PracticeScheduleButchCreateSchema,
+    background: bool = Query(False, description="Run as a job, answer 202 with the job id"),
+    payload: dict = Depends(auth_user.get_current_token_payload)
+):
+    username = payload.get("username")
+    password = payload.get("password")
+
+    if background:
+        return await accept_job("practice_schedules.create_butch", data.model_dump(mode="json"), payload)
+
+    try:
+        async for session in db_helper.user_pwd_session_getter(username, password):
+            return await practice_schedule_crud.create_butch_practice_schedules(
+                session, data, cancel_check=request.is_disconnected
+            )
+    except ProgrammingError:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You have no permissions')
+    except HTTPException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'{e}')
+
+
+@router.post("/create_butch_group")
+async def create_group_schedule_butch(
+    request: Request,
+    data: PracticeScheduleGroupButchCreateSchema,
+    background: bool = Query(False, description="Run as a job, answer 202 with the job id"),
     payload: dict = Depends(auth_user.get_current_token_payload)
 ):
     username = payload.get("username")
     password = payload.get("password")
 
+    if background:
+        return await accept_job("practice_schedules.create_butch_group", data.model_dump(mode="json"), payload)
+
     try:
         async for session in db_helper.user_pwd_session_getter(username, password):
-            return await practice_schedule_crud.create_butch_practice_schedules(session, data)
+            return await practice_schedule_crud.create_butch_group_practice_schedules(
+                session, data, cancel_check=request.is_disconnected
+            )
     except ProgrammingError:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You have no permissions')
     except HTTPException as e:
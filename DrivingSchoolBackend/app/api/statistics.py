@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.exc import ProgrammingError
 
+from core.config import settings
 from core.models import db_helper
 from core.schemas.statistics import StatisticsResponseSchema
 from auth import user as auth_user
+from auth.utils import verified_tokens_cache, password_rehash_statistics
 from crud.statistics import get_statistics
 
 router = APIRouter(prefix="/statistics", tags=["Statistics"])
@@ -21,3 +23,26 @@ async def statistics(
             return await get_statistics(session)
     except ProgrammingError:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You have no permissions')
+
+
+@router.get("/pools")
+async def pools_statistics(
+    payload: dict = Depends(auth_user.get_current_token_payload)
+):
+    if payload.get("role") != settings.roles.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You have no permissions')
+
+    return db_helper.get_pool_statistics()
+
+
+@router.get("/caches")
+async def caches_statistics(
+    payload: dict = Depends(auth_user.get_current_token_payload)
+):
+    if payload.get("role") != settings.roles.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You have no permissions')
+
+    return {
+        "verified_tokens": verified_tokens_cache.get_statistics(),
+        "password_rehash": password_rehash_statistics,
+    }
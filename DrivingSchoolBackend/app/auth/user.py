@@ -3,6 +3,7 @@ from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jwt import InvalidTokenError
 
+from core.config import settings
 from core.models import db_helper
 from core.schemas.user import UserJWTSchema
 from crud import user as crud_user
@@ -11,10 +12,33 @@ from auth import utils as auth_utils
 http_bearer = HTTPBearer()
 
 
+async def validate_auth_user_by_hash(
+    username: str,
+    password: str,
+):
+    # In "set_role" session mode Postgres never sees the password, so it is checked against the stored hash
+    async for session in db_helper.session_getter():
+        user = await crud_user.get_user_by_username(session, username)
+        if not user or not await auth_utils.validate_password_async(password, user.hashed_password):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid username or password")
+
+        user_role = await crud_user.get_user_role_by_username(session, username)
+
+        return UserJWTSchema(
+            id=user.id,
+            username=username,
+            password=password,
+            role=user_role,
+        )
+
+
 async def validate_auth_user(
     username: str,
     password: str,
 ):
+    if settings.db.session_mode == "set_role":
+        return await validate_auth_user_by_hash(username, password)
+
     try:
         async for session in db_helper.user_pwd_session_getter(username, password):
             user = await crud_user.get_user_by_username(session, username)
@@ -27,8 +51,10 @@ async def validate_auth_user(
                 role=user_role,
             )
     except ConnectionDoesNotExistError:
+        await db_helper.user_engines.discard(username, password)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail="Invalid username or password")
     except Exception as e:
+        await db_helper.user_engines.discard(username, password)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
 
 
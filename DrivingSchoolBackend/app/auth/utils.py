@@ -1,3 +1,8 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, datetime, timezone
 
 import bcrypt
@@ -34,16 +39,84 @@ def encode_jwt(
     return encoded
 
 
+class VerifiedTokenCache:
+    """Bounded LRU cache of already verified token payloads, valid until token `exp`."""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size: int = max_size
+        self._items: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def make_key(token: str | bytes, public_key: str, algorithm: str) -> str:
+        if isinstance(token, str):
+            token = token.encode()
+        digest = hashlib.sha256(token)
+        digest.update(f"\x00{algorithm}\x00{public_key}".encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        payload, expires_at = item
+        if expires_at <= time.time():
+            del self._items[key]
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(key)
+        self.hits += 1
+        return payload.copy()
+
+    def set(self, key: str, payload: dict):
+        expires_at = payload.get("exp")
+        if expires_at is None:
+            return
+
+        self._items[key] = (payload.copy(), float(expires_at))
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+    def get_statistics(self) -> dict:
+        return {
+            "size": len(self._items),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+verified_tokens_cache = VerifiedTokenCache(max_size=settings.auth_jwt.verified_tokens_cache_size)
+
+
 def decode_jwt(
     token: str | bytes,
     public_key: str = settings.auth_jwt.public_key_path.read_text(),
     algorithm: str = settings.auth_jwt.algorithm,
+    use_cache: bool = True,
 ):
+    if use_cache:
+        key = verified_tokens_cache.make_key(token, public_key, algorithm)
+        cached = verified_tokens_cache.get(key)
+        if cached is not None:
+            return cached
+
     decoded = jwt.decode(
         token,
         public_key,
         algorithms=[algorithm],
     )
+
+    if use_cache:
+        verified_tokens_cache.set(key, decoded)
     return decoded
 
 
@@ -64,3 +137,43 @@ def validate_password(
         password=password.encode(),
         hashed_password=hashed_password.encode()
     )
+
+
+password_hashing_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hashing.max_workers,
+    thread_name_prefix="password-hashing",
+)
+
+
+async def hash_password_async(
+    password: str,
+) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_hashing_executor, hash_password, password)
+
+
+async def validate_password_async(
+    password: str,
+    hashed_password: str,
+) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_hashing_executor, validate_password, password, hashed_password)
+
+
+password_rehash_statistics = {
+    "skipped": 0,
+    "changed": 0,
+}
+
+
+# Returns new hash only if the password differs from the stored one
+async def hash_password_if_changed(
+    password: str,
+    hashed_password: str,
+) -> str | None:
+    if await validate_password_async(password, hashed_password):
+        password_rehash_statistics["skipped"] += 1
+        return None
+
+    password_rehash_statistics["changed"] += 1
+    return await hash_password_async(password)
@@ -1,7 +1,9 @@
 from datetime import time
 from pathlib import Path
 import re
-from pydantic import BaseModel, PostgresDsn
+from typing import Literal
+
+from pydantic import BaseModel, PostgresDsn, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 BASE_DIR = Path(__file__).parent.parent
@@ -30,6 +32,24 @@ class DatabaseConfig(BaseModel):
     pool_size: int = 5
     max_overflow: int = 10
 
+    # Per-user engines (user_pwd_session_getter)
+    user_pool_size: int = 1
+    user_max_overflow: int = 2
+    user_engines_limit: int = 100
+    user_engine_idle_timeout: int = 300  # seconds
+    user_connections_limit: int = 200
+    # seconds, pooled connections of a user engine are reopened with its credentials after this.
+    # discard_user only drops engines of the current worker, other workers stop reusing
+    # connections opened with an old password after at most user_engine_recycle
+    user_engine_recycle: int = 60
+    # seconds to wait for a free engine when the limits are reached, then 503
+    user_engine_wait_timeout: float = 10
+
+    # "login" - connect as the user itself (user_pwd_session_getter engines),
+    # "set_role" - use the main pool and SET LOCAL ROLE to the user in every transaction,
+    #              the main DB user must be a member of every user role (GRANT <user> TO <main user>)
+    session_mode: Literal["login", "set_role"] = "login"
+
     naming_convention: dict[str, str] = {
         "ix": "ix_%(column_0_label)s",
         "uq": "uq_%(table_name)s_%(column_0_N_name)s",
@@ -44,12 +64,22 @@ class AuthJWT(BaseModel):
     public_key_path: Path = BASE_DIR / "certs" / "jwt-public.pem"
     algorithm: str = "RS256"
     access_token_expire_minutes: int = 60 * 24 * 7  # 7 days just for educational purposes
+    verified_tokens_cache_size: int = 1024
+
+
+class PasswordHashing(BaseModel):
+    # bcrypt runs in a thread pool, so it does not block the event loop
+    max_workers: int = 4
 
 
 class UserRoles(BaseModel):
     admin: str = "admin_role"
     student: str = "student_role"
     instructor: str = "instructor_role"
+    # seconds, username -> role resolution cache. The cache is per process: invalidate_user_role
+    # clears it in the current worker only, other workers see a role change after at most cache_ttl
+    cache_ttl: int = 30
+    cache_size: int = 10000
 
 
 class WorkingInfo(BaseModel):
@@ -57,6 +87,46 @@ class WorkingInfo(BaseModel):
     working_end_time: time = time(hour=20, minute=0)
 
 
+class SchedulingConfig(BaseModel):
+    # "combinatorial" - greedy pass, exact max flow when it falls short; "pulp" - MILP solved by CBC
+    engine: Literal["combinatorial", "pulp"] = "combinatorial"
+    # Solving runs in a process pool, not in the event loop
+    process_workers: int = 2
+    # Not more than process_workers, so an admitted solve never waits for a process; process_workers if not set
+    max_concurrent_solves: int | None = None
+    time_limit: int = 60  # seconds of solving per generator run (CBC returns its best solution by then)
+    time_limit_grace: float = 10.0  # extra seconds to wait for the solver process to hand the solution back
+    gap_rel: float = 0.0  # relative optimality gap accepted by the MILP engine
+    cancel_poll_interval: float = 0.5  # seconds between client disconnect checks
+
+    @model_validator(mode="after")
+    def check_max_concurrent_solves(self):
+        if self.max_concurrent_solves is None:
+            self.max_concurrent_solves = self.process_workers
+        elif self.max_concurrent_solves > self.process_workers:
+            raise ValueError("max_concurrent_solves can not be greater than process_workers")
+        return self
+
+
+class WarmupConfig(BaseModel):
+    enabled: bool = True
+    pool_connections: int = 5  # capped at db.pool_size + db.max_overflow
+    compile_statements: bool = True
+    load_reference_data: bool = True
+
+
+class JobsConfig(BaseModel):
+    # In-process workers claiming queued jobs from the job table
+    workers: int = 2
+    poll_interval: float = 1.0  # seconds between queue polls when it is empty
+    heartbeat_interval: float = 5.0  # seconds between heartbeats (and cancel checks) of a running job
+    stale_timeout: int = 300  # seconds without heartbeat after which a running job is claimed again
+    max_attempts: int = 3
+    # Files uploaded to background jobs (they may hold credentials, so they are kept out of the job table
+    # and deleted when the job finishes). Must be shared storage if several hosts run workers
+    upload_dir: Path | None = None  # a directory in the system temp dir if not set
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=BASE_DIR / ".env",
@@ -68,8 +138,12 @@ class Settings(BaseSettings):
     api: ApiPrefix = ApiPrefix()
     db: DatabaseConfig
     auth_jwt: AuthJWT = AuthJWT()
+    password_hashing: PasswordHashing = PasswordHashing()
     roles: UserRoles = UserRoles()
     working_info: WorkingInfo = WorkingInfo()
+    scheduling: SchedulingConfig = SchedulingConfig()
+    warmup: WarmupConfig = WarmupConfig()
+    jobs: JobsConfig = JobsConfig()
 
 
 settings = Settings()
@@ -8,6 +8,7 @@ __all__ = (
     "GroupSchedule",
     "Instructor",
     "InstructorCategoryLevel",
+    "Job",
     "PracticeSchedule",
     "Student",
     "User",
@@ -23,6 +24,7 @@ from .group import Group
 from .group_schedule import GroupSchedule
 from .instructor import Instructor
 from .instructor_category_level import InstructorCategoryLevel
+from .job import Job
 from .practice_schedule import PracticeSchedule
 from .student import Student
 from .user import User
@@ -1,8 +1,238 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, status
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine
 
 from core.config import settings
 
 
+class UserEngineEntry:
+    def __init__(self, engine: AsyncEngine, username: str, max_connections: int):
+        self.engine: AsyncEngine = engine
+        self.username: str = username
+        self.session_factory = async_sessionmaker(
+            bind=engine,
+            autoflush=False,
+            autocommit=False,
+            expire_on_commit=False,
+        )
+        self.max_connections: int = max_connections
+        self.in_use: int = 0
+        self.last_used: float = time.monotonic()
+
+
+class UserEngineRegistry:
+    """LRU registry of per-credential engines.
+
+    Engines are reused between requests of the same user instead of being created
+    (and leaked) on every call. Idle engines and least recently used ones beyond
+    the limits are disposed. When every engine is in use, a new user waits for one
+    to be released (up to wait_timeout) instead of going over the limits.
+    """
+
+    def __init__(
+        self,
+        echo: bool = False,
+        echo_pool: bool = False,
+        pool_size: int = 1,
+        max_overflow: int = 2,
+        engines_limit: int = 100,
+        idle_timeout: int = 300,
+        connections_limit: int = 200,
+        wait_timeout: float = 10,
+        pool_recycle: int = 60,
+    ):
+        self.echo: bool = echo
+        self.echo_pool: bool = echo_pool
+        self.pool_size: int = pool_size
+        self.max_overflow: int = max_overflow
+        self.engines_limit: int = engines_limit
+        self.idle_timeout: int = idle_timeout
+        self.connections_limit: int = connections_limit
+        self.wait_timeout: float = wait_timeout
+        self.pool_recycle: int = pool_recycle
+
+        self._entries: OrderedDict[str, UserEngineEntry] = OrderedDict()
+        # Notified whenever an engine is released or removed
+        self._lock = asyncio.Condition()
+        self.created: int = 0
+        self.reused: int = 0
+        self.evicted: int = 0
+        self.rejected: int = 0
+
+    @staticmethod
+    def _make_key(username: str, password: str) -> str:
+        return hashlib.sha256(f"{username}\x00{password}".encode()).hexdigest()
+
+    @property
+    def _connections_per_engine(self) -> int:
+        return self.pool_size + self.max_overflow
+
+    def _total_connections(self) -> int:
+        return sum(entry.max_connections for entry in self._entries.values())
+
+    def _has_room(self) -> bool:
+        return (
+            len(self._entries) < self.engines_limit
+            and self._total_connections() + self._connections_per_engine <= self.connections_limit
+        )
+
+    def _pop_evictable(self) -> list[UserEngineEntry]:
+        evicted = []
+        now = time.monotonic()
+
+        # Idle engines
+        for key, entry in list(self._entries.items()):
+            if entry.in_use == 0 and now - entry.last_used > self.idle_timeout:
+                evicted.append(self._entries.pop(key))
+
+        # Least recently used engines over the limits
+        while not self._has_room():
+            key = next((k for k, e in self._entries.items() if e.in_use == 0), None)
+            if key is None:
+                break
+            evicted.append(self._entries.pop(key))
+
+        return evicted
+
+    async def _dispose_entries(self, entries: list[UserEngineEntry]):
+        for entry in entries:
+            await entry.engine.dispose()
+        self.evicted += len(entries)
+
+    # Waits until an engine can be added without going over the limits
+    async def _wait_for_room(self, key: str, evicted: list[UserEngineEntry]):
+        deadline = time.monotonic() + self.wait_timeout
+        while not self._has_room():
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise TimeoutError
+                await asyncio.wait_for(self._lock.wait(), remaining)
+            except TimeoutError:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many database connections in use, try again later",
+                )
+            # Another request of the same user could have created the engine meanwhile
+            if key in self._entries:
+                return
+            evicted.extend(self._pop_evictable())
+
+    async def acquire(self, url: str, username: str, password: str) -> UserEngineEntry:
+        key = self._make_key(username, password)
+        evicted = []
+
+        try:
+            async with self._lock:
+                if key not in self._entries:
+                    evicted.extend(self._pop_evictable())
+                    await self._wait_for_room(key, evicted)
+
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.reused += 1
+                else:
+                    entry = UserEngineEntry(
+                        engine=create_async_engine(
+                            url=url,
+                            echo=self.echo,
+                            echo_pool=self.echo_pool,
+                            pool_size=self.pool_size,
+                            max_overflow=self.max_overflow,
+                            pool_recycle=self.pool_recycle,
+                        ),
+                        username=username,
+                        max_connections=self._connections_per_engine,
+                    )
+                    self._entries[key] = entry
+                    self.created += 1
+
+                entry.in_use += 1
+                entry.last_used = time.monotonic()
+        finally:
+            await self._dispose_entries(evicted)
+        return entry
+
+    async def release(self, entry: UserEngineEntry):
+        async with self._lock:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+            if entry.in_use == 0:
+                self._lock.notify_all()
+
+    async def discard(self, username: str, password: str):
+        key = self._make_key(username, password)
+        async with self._lock:
+            entry = self._entries.pop(key, None)
+            self._lock.notify_all()
+        if entry is not None:
+            await self._dispose_entries([entry])
+
+    # Drops every engine of the user, e.g. after a password change,
+    # so pooled connections opened with the old password are not reused.
+    # Only engines of this process are dropped, other workers rely on pool_recycle
+    async def discard_user(self, username: str):
+        async with self._lock:
+            evicted = [
+                self._entries.pop(key)
+                for key, entry in list(self._entries.items())
+                if entry.username == username
+            ]
+            self._lock.notify_all()
+        await self._dispose_entries(evicted)
+
+    async def evict_idle(self):
+        async with self._lock:
+            now = time.monotonic()
+            evicted = [
+                self._entries.pop(key)
+                for key, entry in list(self._entries.items())
+                if entry.in_use == 0 and now - entry.last_used > self.idle_timeout
+            ]
+            self._lock.notify_all()
+        await self._dispose_entries(evicted)
+
+    async def dispose(self):
+        async with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        await self._dispose_entries(entries)
+
+    def get_statistics(self) -> dict:
+        now = time.monotonic()
+        engines = []
+        for entry in self._entries.values():
+            pool = entry.engine.pool
+            engines.append({
+                "in_use": entry.in_use,
+                "idle_seconds": round(now - entry.last_used, 1),
+                "pool_size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            })
+
+        return {
+            "engines_count": len(self._entries),
+            "engines_limit": self.engines_limit,
+            "connections_reserved": self._total_connections(),
+            "connections_limit": self.connections_limit,
+            "connections_checked_out": sum(e["checked_out"] for e in engines),
+            "created": self.created,
+            "reused": self.reused,
+            "evicted": self.evicted,
+            "rejected": self.rejected,
+            "engines": engines,
+        }
+
+
 class DatabaseHelper:
     def __init__(
         self,
@@ -15,6 +245,14 @@ class DatabaseHelper:
         echo_pool: bool = False,
         pool_size: int = 5,
         max_overflow: int = 10,
+        user_pool_size: int = 1,
+        user_max_overflow: int = 2,
+        user_engines_limit: int = 100,
+        user_engine_idle_timeout: int = 300,
+        user_connections_limit: int = 200,
+        user_engine_wait_timeout: float = 10,
+        user_engine_recycle: int = 60,
+        session_mode: str = "login",
     ):
         self.host: str = host
         self.port: int = port
@@ -24,6 +262,7 @@ class DatabaseHelper:
         self.echo_pool: bool = echo_pool
         self.pool_size: int = pool_size
         self.max_overflow: int = max_overflow
+        self.session_mode: str = session_mode
 
         self.engine = create_async_engine(
             url=url,
@@ -38,8 +277,20 @@ class DatabaseHelper:
             autocommit=False,
             expire_on_commit=False,
         )
+        self.user_engines = UserEngineRegistry(
+            echo=echo,
+            echo_pool=echo_pool,
+            pool_size=user_pool_size,
+            max_overflow=user_max_overflow,
+            engines_limit=user_engines_limit,
+            idle_timeout=user_engine_idle_timeout,
+            connections_limit=user_connections_limit,
+            wait_timeout=user_engine_wait_timeout,
+            pool_recycle=user_engine_recycle,
+        )
 
     async def dispose(self):
+        await self.user_engines.dispose()
         await self.engine.dispose()
 
     async def session_getter(self):
@@ -53,28 +304,55 @@ class DatabaseHelper:
     ):
         return f"{self.dbms_engine}://{username}:{password}@{self.host}:{self.port}/{self.db_name}"
 
-    # Dynamic session generator based on username and password conn string
+    # Session generator from the main pool impersonating the user role,
+    # SET LOCAL is reapplied at the start of every transaction of the session
+    async def role_session_getter(
+        self,
+        username: str,
+    ):
+        role = self.engine.dialect.identifier_preparer.quote(username)
+
+        async with self.session_factory() as session:
+            @event.listens_for(session.sync_session, "after_begin")
+            def set_local_role(sync_session, transaction, connection):
+                connection.exec_driver_sql(f"SET LOCAL ROLE {role}")
+
+            yield session
+
+    # Dynamic session generator based on username and password conn string,
+    # engines are cached per credentials in user_engines registry
     async def user_pwd_session_getter(
         self,
         username: str,
         password: str,
     ):
-        engine = create_async_engine(
+        if self.session_mode == "set_role":
+            async for session in self.role_session_getter(username):
+                yield session
+            return
+
+        entry = await self.user_engines.acquire(
             url=self._get_user_pwd_connection_string(username, password),
-            echo=self.echo,
-            echo_pool=self.echo_pool,
-            pool_size=self.pool_size,
-            max_overflow=self.max_overflow,
-        )
-        session_factory = async_sessionmaker(
-            bind=engine,
-            autoflush=False,
-            autocommit=False,
-            expire_on_commit=False,
+            username=username,
+            password=password,
         )
+        try:
+            async with entry.session_factory() as session:
+                yield session
+        finally:
+            await self.user_engines.release(entry)
 
-        async with session_factory() as session:
-            yield session
+    def get_pool_statistics(self) -> dict:
+        pool = self.engine.pool
+        return {
+            "main": {
+                "pool_size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            },
+            "users": self.user_engines.get_statistics(),
+        }
 
 
 db_helper = DatabaseHelper(
@@ -87,4 +365,12 @@ db_helper = DatabaseHelper(
     echo_pool=settings.db.echo_pool,
     pool_size=settings.db.pool_size,
     max_overflow=settings.db.max_overflow,
+    user_pool_size=settings.db.user_pool_size,
+    user_max_overflow=settings.db.user_max_overflow,
+    user_engines_limit=settings.db.user_engines_limit,
+    user_engine_idle_timeout=settings.db.user_engine_idle_timeout,
+    user_connections_limit=settings.db.user_connections_limit,
+    user_engine_wait_timeout=settings.db.user_engine_wait_timeout,
+    user_engine_recycle=settings.db.user_engine_recycle,
+    session_mode=settings.db.session_mode,
 )
@@ -21,7 +21,7 @@ class Group(Base):
     name: Mapped[str] = mapped_column(String(50), unique=True)
     created_date: Mapped[date]
     category_level_id: Mapped[int] = mapped_column(ForeignKey('category_level.id', ondelete="CASCADE"))
-    instructor_id: Mapped[int | None] = mapped_column(ForeignKey('instructor.id', ondelete="SET NULL"))
+    instructor_id: Mapped[int | None] = mapped_column(ForeignKey('instructor.id', ondelete="SET NULL"), index=True)
 
     category_level: Mapped["CategoryLevel"] = relationship(back_populates="groups")
     instructor: Mapped["Instructor"] = relationship(back_populates="groups")
@@ -1,7 +1,8 @@
 import datetime
 from datetime import time
 
-from sqlalchemy import ForeignKey, CheckConstraint
+from sqlalchemy import ForeignKey, CheckConstraint, Index, Computed
+from sqlalchemy.dialects.postgresql import TSRANGE, Range
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
@@ -15,11 +16,20 @@ if TYPE_CHECKING:
 
 class GroupSchedule(Base):
     __tablename__ = 'group_schedule'
+    __table_args__ = (
+        Index("ix_group_schedule_group_id_date", "group_id", "date", "start_time"),
+        Index("ix_group_schedule_cabinet_id_date", "cabinet_id", "date", "start_time"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
+    # Kept for date range scans that reach lessons through group.instructor_id
     date: Mapped[datetime.date] = mapped_column(index=True)
-    start_time: Mapped[time] = mapped_column(index=True)
-    end_time: Mapped[time] = mapped_column(index=True)
+    start_time: Mapped[time]
+    end_time: Mapped[time]
+    # [date + start_time, date + end_time), filled by the database; overlap checks use &&
+    time_range: Mapped[Range[datetime.datetime]] = mapped_column(
+        TSRANGE, Computed("tsrange(date + start_time, date + end_time)", persisted=True)
+    )
     group_id: Mapped[int] = mapped_column(ForeignKey('group.id', ondelete="CASCADE"))
     # instructor_id: Mapped[int] = mapped_column(ForeignKey('instructor.id', ondelete="CASCADE"))
     cabinet_id: Mapped[int] = mapped_column(ForeignKey('cabinet.id', ondelete="CASCADE"))
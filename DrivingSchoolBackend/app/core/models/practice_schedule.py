@@ -1,7 +1,8 @@
 import datetime
 from datetime import time
 
-from sqlalchemy import ForeignKey, CheckConstraint
+from sqlalchemy import ForeignKey, CheckConstraint, Index, Computed
+from sqlalchemy.dialects.postgresql import TSRANGE, Range
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
@@ -16,11 +17,20 @@ if TYPE_CHECKING:
 
 class PracticeSchedule(Base):
     __tablename__ = 'practice_schedule'
+    __table_args__ = (
+        Index("ix_practice_schedule_instructor_id_date", "instructor_id", "date", "start_time"),
+        Index("ix_practice_schedule_vehicle_id_date", "vehicle_id", "date", "start_time"),
+        Index("ix_practice_schedule_student_id_date", "student_id", "date", "start_time"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    date: Mapped[datetime.date] = mapped_column(index=True)
-    start_time: Mapped[time] = mapped_column(index=True)
-    end_time: Mapped[time] = mapped_column(index=True)
+    date: Mapped[datetime.date]
+    start_time: Mapped[time]
+    end_time: Mapped[time]
+    # [date + start_time, date + end_time), filled by the database; overlap checks use &&
+    time_range: Mapped[Range[datetime.datetime]] = mapped_column(
+        TSRANGE, Computed("tsrange(date + start_time, date + end_time)", persisted=True)
+    )
     instructor_id: Mapped[int] = mapped_column(ForeignKey('instructor.id', ondelete="CASCADE"))
     vehicle_id: Mapped[int] = mapped_column(ForeignKey('vehicle.id', ondelete="CASCADE"))
     student_id: Mapped[int] = mapped_column(ForeignKey('student.id', ondelete="CASCADE"))
@@ -24,8 +24,13 @@ class GroupScheduleReadSchema(GroupScheduleSchema):
     id: int
 
 
+class GroupScheduleValidateBatchSchema(BaseModel):
+    lessons: list[GroupScheduleCreateSchema] = Field(min_length=1, max_length=1000)
+
+
 class ExistingGroupScheduleSchema(GroupScheduleSchema):
-    instructor_id: int
+    # None for lessons of groups without an instructor (group.instructor_id is SET NULL)
+    instructor_id: int | None = None
 
 
 class GroupForScheduleSchema(BaseModel):
@@ -39,3 +44,15 @@ class GroupScheduleButchCreateSchema(BaseModel):
     end_date: date = date.today() + timedelta(days=30)
     schedules_per_day: int = 1
     include_weekends: bool = False
+    # Keep the best plan found even if not all lessons fit, instead of failing
+    allow_partial: bool = False
+
+
+class GroupScheduleSchoolButchCreateSchema(BaseModel):
+    # All groups without schedules if not set
+    group_ids: list[int] | None = None
+    start_date: date = date.today() + timedelta(days=1)
+    end_date: date = date.today() + timedelta(days=30)
+    schedules_per_day: int = 1
+    include_weekends: bool = False
+    allow_partial: bool = False
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class JobReadSchema(BaseModel):
+    id: int
+    kind: str
+    status: str
+    progress: float
+    progress_message: str | None = None
+    error: str | None = None
+    attempts: int
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+
+class JobAcceptedSchema(BaseModel):
+    id: int
+    status: str
+    status_url: str
+    result_url: str
@@ -27,6 +27,10 @@ class PracticeScheduleReadSchema(PracticeScheduleSchema):
     id: int
 
 
+class PracticeScheduleValidateBatchSchema(BaseModel):
+    lessons: list[PracticeScheduleCreateSchema] = Field(min_length=1, max_length=1000)
+
+
 class PracticeScheduleButchCreateSchema(BaseModel):
     student_id: int
     instructor_id: int
@@ -34,6 +38,21 @@ class PracticeScheduleButchCreateSchema(BaseModel):
     end_date: date = date.today() + timedelta(days=30)
     schedules_per_day: int = 1
     include_weekends: bool = False
+    # Keep the best plan found even if not all lessons fit, instead of failing
+    allow_partial: bool = False
+
+
+class PracticeScheduleGroupButchCreateSchema(BaseModel):
+    group_id: int
+    # Students are distributed between instructors evenly
+    instructor_ids: list[int] = Field(min_length=1)
+    # Only these students of the group, all students if not set
+    student_ids: list[int] | None = None
+    start_date: date = date.today() + timedelta(days=1)
+    end_date: date = date.today() + timedelta(days=30)
+    schedules_per_day: int = 1
+    include_weekends: bool = False
+    allow_partial: bool = False
 
 
 class StudentForScheduleSchema(BaseModel):
@@ -0,0 +1,28 @@
+from datetime import date
+
+from pydantic import BaseModel
+
+
+class ScheduleSolveStatisticsSchema(BaseModel):
+    engine: str
+    status: str
+    requested_count: int
+    generated_count: int
+    candidate_slots_count: int
+    solve_seconds: float
+    min_extension_days: int | None = None
+    suggested_end_date: date | None = None
+    # Joint solves only: students (or groups) that did not get all of their lessons
+    incomplete_ids: list[int] | None = None
+
+
+class SchoolTimetableStatisticsSchema(ScheduleSolveStatisticsSchema):
+    groups_count: int
+    # Groups without an instructor, left out of the timetable
+    skipped_ids: list[int] = []
+    scheduled_groups_count: int
+    total_seconds: float
+    groups_per_second: float
+    # cabinet id -> booked share of working time in the period, existing and new lessons
+    cabinet_utilization: dict[int, float]
+    average_cabinet_utilization: float
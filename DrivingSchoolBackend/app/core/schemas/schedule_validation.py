@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+
+
+class ScheduleValidationItemSchema(BaseModel):
+    # Position of the lesson in the request
+    index: int
+    valid: bool
+    # Same messages as the create endpoint returns, all problems of the lesson at once
+    errors: list[str] = []
+
+
+class ScheduleValidationBatchResultSchema(BaseModel):
+    valid: bool
+    valid_count: int
+    invalid_count: int
+    items: list[ScheduleValidationItemSchema]
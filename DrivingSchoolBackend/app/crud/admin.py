@@ -2,8 +2,8 @@ from fastapi import HTTPException, status
 from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from auth.utils import hash_password
-from core.models import User
+from auth.utils import hash_password_if_changed
+from core.models import db_helper, User
 from core.schemas.admin import AdminUpdateSchema
 from core.schemas.profile import AdminProfileSchema
 from crud.user import get_user_by_phone_number
@@ -55,17 +55,23 @@ async def update_admin(session: AsyncSession, admin_id: int, data: AdminUpdateSc
     user.birthday = data.user.birthday
     user.phone_number = data.user.phone_number
 
+    password_changed = False
     if data.password:
-        new_hashed_password = hash_password(data.password)
+        new_hashed_password = await hash_password_if_changed(data.password, user.hashed_password)
 
-        if user.hashed_password != new_hashed_password:
+        if new_hashed_password:
             user.hashed_password = new_hashed_password
 
             query = text(f"""
                 ALTER USER "{user.username}" WITH PASSWORD '{data.password}';
             """)
             await session.execute(query)
+            password_changed = True
 
     await session.commit()
+    # Refreshed before the engines are dropped: a user changing their own password works through
+    # one of them, and a new connection would be opened with the old password from the token
     await session.refresh(admin)
+    if password_changed:
+        await db_helper.user_engines.discard_user(user.username)
     return admin
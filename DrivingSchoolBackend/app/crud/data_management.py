@@ -1,42 +1,52 @@
 from datetime import date, timedelta
+from functools import cache
 from random import randint, choice
 
-from faker import Faker
 from fastapi import HTTPException, status
 from pydantic import ValidationError
-from sqlalchemy import select, and_, text
+from sqlalchemy import select, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from core.config import settings
 from core.models import CategoryLevel, Cabinet, Vehicle, User, Instructor, InstructorCategoryLevel, CategoryLevelInfo, \
     Group, Student
-from auth.utils import hash_password
+from auth.utils import hash_password_async
 from core.schemas.cabinet import CabinetCreateSchema
 from core.schemas.category_level import CategoryLevelCreateSchema
 from core.schemas.group import GroupCreateSchema
-from core.schemas.group_schedule import GroupScheduleButchCreateSchema
+from core.schemas.group_schedule import GroupScheduleSchoolButchCreateSchema
 from core.schemas.instructor import InstructorCreateSchema
-from core.schemas.practice_schedule import PracticeScheduleButchCreateSchema
+from core.schemas.practice_schedule import PracticeScheduleGroupButchCreateSchema
 from core.schemas.student import StudentCreateSchema
 from core.schemas.user import UserSchema
 from core.schemas.vehicle import VehicleCreateSchema
 from crud.category_level import get_all_category_levels, get_category_level_by_id
-from crud.group_schedule import create_butch_group_schedules, get_max_schedule_date_by_group_id
+from crud.group_schedule import create_butch_school_group_schedules, get_max_schedule_date_by_group_id
 from crud.instructor import get_instructors_by_category_level_id
-from crud.practice_schedule import create_butch_practice_schedules
-from crud.user import get_user_by_username, get_user_by_phone_number
+from crud.job import ProgressCallback
+from crud.practice_schedule import create_butch_group_practice_schedules
+from crud.role_provisioning import RoleProvisioner
+from crud.user import get_user_by_username, get_user_by_phone_number, invalidate_user_role
 
 
-fake = Faker()
+# Faker builds its provider tables on creation, so it is created on first use only
+@cache
+def get_faker():
+    from faker import Faker
+    return Faker()
 
 
 async def load_initial_data(
     data: dict,
-    session: AsyncSession
+    session: AsyncSession,
+    progress: ProgressCallback | None = None,
 ):
 
     try:
         # === CategoryLevels ===
+        if progress:
+            await progress(0.0, "Category levels")
         category_level_map = {}
         category_level_age_map = {}
         for c in data["category_levels"]:
@@ -88,6 +98,8 @@ async def load_initial_data(
             category_level_age_map[category_level.id] = info.minimum_age_to_get
 
         # === Cabinets ===
+        if progress:
+            await progress(0.25, "Cabinets")
         for cab in data["cabinets"]:
             c = CabinetCreateSchema(
                 name=cab["name"]
@@ -109,6 +121,8 @@ async def load_initial_data(
             session.add(cabinet)
 
         # === Vehicles ===
+        if progress:
+            await progress(0.4, "Vehicles")
         for v in data["vehicles"]:
             cat_id = category_level_map[(v["category"], v["transmission"])]
 
@@ -142,6 +156,9 @@ async def load_initial_data(
             session.add(vehicle)
 
         # === Instructors ===
+        if progress:
+            await progress(0.55, "Instructors")
+        provisioner = RoleProvisioner()
         for inst in data["instructors"]:
 
             i = InstructorCreateSchema(
@@ -178,7 +195,7 @@ async def load_initial_data(
                 patronymic=i.user.patronymic,
                 birthday=i.user.birthday,
                 phone_number=i.user.phone_number,
-                hashed_password=hash_password(i.password),
+                hashed_password=await hash_password_async(i.password),
             )
             session.add(user)
             await session.flush()
@@ -189,14 +206,8 @@ async def load_initial_data(
             )
             session.add(instructor)
 
-            create_query = text(f"""
-                    CREATE USER "{i.user.username}" WITH PASSWORD '{i.password}';
-                """)
-            grant_query = text(f"""
-                    GRANT instructor_role TO "{i.user.username}";
-                """)
-            await session.execute(create_query)
-            await session.execute(grant_query)
+            provisioner.add(i.user.username, i.password, settings.roles.instructor)
+            invalidate_user_role(i.user.username)
 
             today = date.today()
 
@@ -220,6 +231,7 @@ async def load_initial_data(
                 )
                 session.add(link)
 
+        await provisioner.flush(session)
         await session.commit()
 
         return {"detail": "Data loaded successfully"}
@@ -233,13 +245,30 @@ async def load_initial_data(
         raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 
-async def generate_test_data(session: AsyncSession):
+# Creates what fits into the period and then extends it once, to the end date suggested by the solver
+# (or by 30 days without a suggestion). Returns the number of lessons that still did not fit
+async def _create_schedules_with_extension(session: AsyncSession, create_schedules, data) -> int:
+    statistics = (await create_schedules(session, data))["statistics"]
+    if statistics["generated_count"] == statistics["requested_count"]:
+        return 0
+
+    end_date = statistics["suggested_end_date"] or data.end_date + timedelta(days=30)
+    # Lessons created by the first call are counted as existing, only the rest is requested again
+    statistics = (await create_schedules(session, data.model_copy(update={"end_date": end_date})))["statistics"]
+    return statistics["requested_count"] - statistics["generated_count"]
+
+
+async def generate_test_data(session: AsyncSession, progress: ProgressCallback | None = None):
+    fake = get_faker()
+
     category_levels = await get_all_category_levels(session)
     category_levels_ids = [cl.id for cl in category_levels]
 
     # === Groups ===
-    group_list = []
-    student_list = []
+    if progress:
+        await progress(0.0, "Groups and students")
+    provisioner = RoleProvisioner()
+    group_list = {}
     group_count = 2
     for i in range(group_count):
         cat_id = choice(category_levels_ids)
@@ -264,7 +293,7 @@ async def generate_test_data(session: AsyncSession):
         session.add(group)
         await session.flush()
 
-        group_list.append(group.id)
+        group_list[group.id] = cat_id
 
         # === Students ===
         student_count = randint(14, 23)
@@ -310,7 +339,7 @@ async def generate_test_data(session: AsyncSession):
                 patronymic=stud.user.patronymic,
                 birthday=stud.user.birthday,
                 phone_number=stud.user.phone_number,
-                hashed_password=hash_password(stud.password),
+                hashed_password=await hash_password_async(stud.password),
             )
             session.add(user)
             await session.flush()
@@ -322,68 +351,73 @@ async def generate_test_data(session: AsyncSession):
             )
             session.add(student)
 
-            create_query = text(f"""
-                    CREATE USER "{stud.user.username}" WITH PASSWORD '{stud.password}';
-                """)
-            grant_query = text(f"""
-                    GRANT student_role TO "{stud.user.username}";
-                """)
-            await session.execute(create_query)
-            await session.execute(grant_query)
-
-            student_list.append((student.id, stud.category_level_id, stud.group_id))
+            provisioner.add(stud.user.username, stud.password, settings.roles.student)
+            invalidate_user_role(stud.user.username)
 
+    await provisioner.flush(session)
     await session.commit()
 
     # === Group schedule ===
-    for group_id in group_list:
-        start_date = date.today() + timedelta(days=randint(1, 30))
-        end_date = start_date + timedelta(days=randint(30, 60))
-
-        while True:
-            gr_sch = GroupScheduleButchCreateSchema(
-                group_id=group_id,
-                start_date=start_date,
-                end_date=end_date,
-                schedules_per_day=randint(1, 3),
-                include_weekends=choice([True, False])
-            )
-            try:
-                await create_butch_group_schedules(session, gr_sch)
-                break
-            except Exception as e:
-                if "Not all schedules can be generated" in str(e):
-                    end_date += timedelta(days=30)
-                else:
-                    raise e
+    if progress:
+        await progress(0.3, "Group schedules")
+    # New groups are planned together, sharing cabinets
+    start_date = date.today() + timedelta(days=randint(1, 30))
+    end_date = start_date + timedelta(days=randint(30, 60))
+
+    gr_sch = GroupScheduleSchoolButchCreateSchema(
+        group_ids=list(group_list),
+        start_date=start_date,
+        end_date=end_date,
+        schedules_per_day=randint(1, 3),
+        include_weekends=choice([True, False]),
+        allow_partial=True,
+    )
+    unscheduled_group_count = await _create_schedules_with_extension(
+        session, create_butch_school_group_schedules, gr_sch
+    )
 
     # === Practice schedule ===
-    for student_id, cat_id, group_id in student_list:
-        inst_ids = [i.id for i in await get_instructors_by_category_level_id(session, cat_id)]
-
+    # Students of a group are planned together, sharing vehicles and instructors
+    unscheduled_practice_count = 0
+    skipped_groups_count = 0
+    for i, (group_id, cat_id) in enumerate(group_list.items()):
+        if progress:
+            await progress(0.5 + 0.5 * i / len(group_list), f"Practice schedules of group {i + 1}/{len(group_list)}")
         max_group_schedule_date = await get_max_schedule_date_by_group_id(session, group_id)
+        if not max_group_schedule_date:
+            # Practice starts after the theory lessons, a group without them is left unplanned
+            skipped_groups_count += 1
+            continue
+
+        inst_ids = [i.id for i in await get_instructors_by_category_level_id(session, cat_id)]
         start_date = max_group_schedule_date + timedelta(days=randint(1, 10))
         end_date = start_date + timedelta(days=randint(30, 60))
 
-        while True:
-            pr_sch = PracticeScheduleButchCreateSchema(
-                student_id=student_id,
-                instructor_id=choice(inst_ids),
-                start_date=start_date,
-                end_date=end_date,
-                schedules_per_day=randint(1, 3),
-                include_weekends=choice([True, False])
-            )
-            try:
-                await create_butch_practice_schedules(session, pr_sch)
-                break
-            except Exception as e:
-                if "Not all schedules can be generated" in str(e):
-                    end_date += timedelta(days=30)
-                else:
-                    raise e
-
-    return {"detail": "Test data has generated"}
+        pr_sch = PracticeScheduleGroupButchCreateSchema(
+            group_id=group_id,
+            instructor_ids=inst_ids,
+            start_date=start_date,
+            end_date=end_date,
+            schedules_per_day=randint(1, 3),
+            include_weekends=choice([True, False]),
+            allow_partial=True,
+        )
+        unscheduled_practice_count += await _create_schedules_with_extension(
+            session, create_butch_group_practice_schedules, pr_sch
+        )
+
+    unscheduled = {
+        "group_schedules": unscheduled_group_count,
+        "practice_schedules": unscheduled_practice_count,
+        "groups_without_practice": skipped_groups_count,
+    }
+    if any(unscheduled.values()):
+        detail = (f"Test data has generated, left unscheduled: {unscheduled_group_count} group schedules, "
+                  f"{unscheduled_practice_count} practice schedules, "
+                  f"{skipped_groups_count} groups without practice schedules")
+    else:
+        detail = "Test data has generated"
+    return {"detail": detail, "unscheduled": unscheduled}
 
 
 async def get_export_data(session: AsyncSession):
@@ -139,6 +139,16 @@ async def get_groups_paginated(
     return result
 
 
+# Groups of the only_without_sch filter of get_groups_paginated, without paging
+async def get_groups_without_schedules(session: AsyncSession):
+    result = await session.execute(
+        select(Group)
+        .where(~exists().where(GroupSchedule.group_id == Group.id))
+        .order_by(Group.name)
+    )
+    return result.scalars().all()
+
+
 async def get_groups_by_category_level_id(session: AsyncSession, category_level_id: int):
     exists = await get_category_level_by_id(session, category_level_id)
 
@@ -1,63 +1,36 @@
 from datetime import date, timedelta
 
-from sqlalchemy import select, and_, or_, func
+from sqlalchemy import select, and_, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from sqlalchemy.orm import joinedload
 
 from core.config import settings
-from core.models import GroupSchedule, Group, Student
-from core.schemas.group_schedule import GroupScheduleCreateSchema, GroupScheduleUpdateSchema, GroupScheduleSchema, \
-    GroupScheduleButchCreateSchema, ExistingGroupScheduleSchema, GroupForScheduleSchema
+from core.models import GroupSchedule, Group, Student, Cabinet
+from core.schemas.group_schedule import GroupScheduleCreateSchema, GroupScheduleUpdateSchema, \
+    GroupScheduleButchCreateSchema, GroupForScheduleSchema, GroupScheduleSchoolButchCreateSchema, \
+    GroupScheduleValidateBatchSchema
+from core.schemas.schedule_validation import ScheduleValidationItemSchema, ScheduleValidationBatchResultSchema
 from core.schemas.profile_schedule import StudentProfileScheduleSchema, InstructorProfileScheduleSchema, \
     ProfileScheduleSchema
 from crud.cabinet import get_cabinet_by_id, get_all_cabinets
-from crud.category_level import get_category_level_by_id
-from crud.group import get_group_by_id
+from crud.category_level import get_category_level_by_id, get_all_category_levels
+from crud.group import get_group_by_id, get_groups_without_schedules
 from crud.instructor import get_instructor_by_id
-from schedule_generators.group_schedule import generate_group_schedule
+from crud.schedule_conflict import get_instructor_conflict, get_group_batch_conflicts, find_batch_overlaps, \
+    INSTRUCTOR_CONFLICT_MESSAGES
+from crud.schedule_context import load_existing_group_schedules, load_existing_practice_schedules
+from crud.schedule_persistence import bulk_insert_schedules, raise_schedule_conflict
+from schedule_generators.common import get_extension_hint
+from schedule_generators.group_schedule import generate_group_schedule, generate_school_group_schedule
+from schedule_generators.runner import run_generator, CancelCheck
 
 
-async def check_schedule_conflict(session: AsyncSession, data: GroupScheduleSchema, schedule_id: int | None = None):
-    filters = [
-        GroupSchedule.date == data.date,
-        or_(
-            and_(GroupSchedule.start_time <= data.start_time, GroupSchedule.end_time > data.start_time),
-            and_(GroupSchedule.start_time < data.end_time, GroupSchedule.end_time >= data.end_time),
-            and_(GroupSchedule.start_time >= data.start_time, GroupSchedule.end_time <= data.end_time),
-        )
-    ]
-    if schedule_id:
-        exclude_self = GroupSchedule.id != schedule_id
-    else:
-        exclude_self = True
-
-    # Cabinet
-    cabinet_query = select(GroupSchedule).where(
-        and_(
-            *filters,
-            GroupSchedule.cabinet_id == data.cabinet_id,
-            exclude_self
-        )
-    )
-
-    # Group
-    group_query = select(GroupSchedule).where(
-        and_(
-            *filters,
-            GroupSchedule.group_id == data.group_id,
-            exclude_self
-        )
-    )
-
-    cabinet_result = await session.execute(cabinet_query)
-    group_result = await session.execute(group_query)
-
-    if cabinet_result.scalars().all():
-        return "cabinet"
-    if group_result.scalars().all():
-        return "group"
-    return None
+SCHEDULE_CONFLICT_MESSAGES = {
+    "ex_group_schedule_cabinet_id": "Schedule conflict detected: this cabinet already has a lesson at that time",
+    "ex_group_schedule_group_id": "Schedule conflict detected: this group already has a lesson at that time",
+}
 
 
 async def create_group_schedule(session: AsyncSession, data: GroupScheduleCreateSchema):
@@ -74,25 +47,28 @@ async def create_group_schedule(session: AsyncSession, data: GroupScheduleCreate
             detail="Wrong time: end time should be greater than start time"
         )
 
-    existing = await get_group_by_id(session, data.group_id)
+    group = await get_group_by_id(session, data.group_id)
 
     existing = await get_cabinet_by_id(session, data.cabinet_id)
 
-    conflict_type = await check_schedule_conflict(session, data)
-    if conflict_type == "cabinet":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Schedule conflict detected: this cabinet already has a lesson at that time"
-        )
-    elif conflict_type == "group":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Schedule conflict detected: this group already has a lesson at that time"
+    if group.instructor_id:
+        conflict_type = await get_instructor_conflict(
+            session, group.instructor_id, data.date, data.start_time, data.end_time,
+            group_id=group.id
         )
+        if conflict_type:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=INSTRUCTOR_CONFLICT_MESSAGES[conflict_type]
+            )
 
     schedule = GroupSchedule(**data.model_dump())
     session.add(schedule)
-    await session.commit()
+    try:
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        raise_schedule_conflict(e, SCHEDULE_CONFLICT_MESSAGES)
     await session.refresh(schedule)
     return schedule
 
@@ -119,30 +95,98 @@ async def update_group_schedule(session: AsyncSession, schedule_id: int, data: G
             detail="Wrong time: end time should be greater than start time"
         )
 
-    existing = await get_group_by_id(session, data.group_id)
+    group = await get_group_by_id(session, data.group_id)
 
     existing = await get_cabinet_by_id(session, data.cabinet_id)
 
-    conflict_type = await check_schedule_conflict(session, data, schedule_id=schedule_id)
-    if conflict_type == "cabinet":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Schedule conflict detected: this cabinet already has a lesson at that time"
-        )
-    elif conflict_type == "group":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Schedule conflict detected: this group already has a lesson at that time"
+    if group.instructor_id:
+        conflict_type = await get_instructor_conflict(
+            session, group.instructor_id, data.date, data.start_time, data.end_time,
+            group_schedule_id=schedule_id, group_id=group.id
         )
+        if conflict_type:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=INSTRUCTOR_CONFLICT_MESSAGES[conflict_type]
+            )
 
     for field, value in data.model_dump().items():
         setattr(schedule, field, value)
 
-    await session.commit()
+    try:
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        raise_schedule_conflict(e, SCHEDULE_CONFLICT_MESSAGES)
     await session.refresh(schedule)
     return schedule
 
 
+async def validate_group_schedules(session: AsyncSession, data: GroupScheduleValidateBatchSchema):
+    lessons = data.lessons
+
+    result = await session.execute(
+        select(Group.id, Group.instructor_id).where(Group.id.in_({lesson.group_id for lesson in lessons}))
+    )
+    group_instructor_ids = dict(result.all())
+
+    result = await session.execute(
+        select(Cabinet.id).where(Cabinet.id.in_({lesson.cabinet_id for lesson in lessons}))
+    )
+    cabinets = set(result.scalars().all())
+
+    timed_lessons = [(index, lesson) for index, lesson in enumerate(lessons) if lesson.start_time < lesson.end_time]
+    conflicts = await get_group_batch_conflicts(session, timed_lessons, group_instructor_ids)
+    batch_overlaps = find_batch_overlaps(
+        [
+            (index, kind, getattr(lesson, f"{kind}_id"), lesson.date, lesson.start_time, lesson.end_time)
+            for index, lesson in timed_lessons
+            for kind in ("cabinet", "group")
+        ] + [
+            # Lessons of different groups taught by the same instructor
+            (index, "instructor", group_instructor_ids.get(lesson.group_id),
+             lesson.date, lesson.start_time, lesson.end_time)
+            for index, lesson in timed_lessons
+        ]
+    )
+
+    today = date.today()
+    items = []
+    for index, lesson in enumerate(lessons):
+        errors = []
+        if lesson.date <= today:
+            errors.append(f"Wrong date: date should be at least tomorrow ({today + timedelta(days=1)})")
+        if lesson.start_time >= lesson.end_time:
+            errors.append("Wrong time: end time should be greater than start time")
+        if lesson.group_id not in group_instructor_ids:
+            errors.append("Group not found")
+        if lesson.cabinet_id not in cabinets:
+            errors.append("Cabinet not found")
+
+        for kind in conflicts.get(index, []):
+            if kind == "instructor_practice":
+                errors.append(INSTRUCTOR_CONFLICT_MESSAGES["practice"])
+            elif kind == "instructor_group":
+                errors.append(INSTRUCTOR_CONFLICT_MESSAGES["group"])
+            else:
+                errors.append(SCHEDULE_CONFLICT_MESSAGES[f"ex_group_schedule_{kind}_id"])
+        for kind, other in batch_overlaps.get(index, []):
+            # Overlaps inside one group are already reported for the group
+            if kind == "instructor" and lessons[other].group_id == lesson.group_id:
+                continue
+            errors.append(f"Schedule conflict detected: this {kind} has lesson {other} of this batch at that time")
+
+        items.append(ScheduleValidationItemSchema(index=index, valid=not errors, errors=errors))
+
+    valid_count = sum(item.valid for item in items)
+    return ScheduleValidationBatchResultSchema(
+        valid=valid_count == len(items),
+        valid_count=valid_count,
+        invalid_count=len(items) - valid_count,
+        items=items,
+    )
+
+
 async def get_group_schedule_by_id(session: AsyncSession, schedule_id: int):
     result = await session.execute(select(GroupSchedule).where(GroupSchedule.id == schedule_id))
     group_schedule = result.scalar_one_or_none()
@@ -289,6 +333,7 @@ async def get_group_schedules_by_group_and_date(session, group_id: int, date: da
 async def create_butch_group_schedules(
     session: AsyncSession,
     data: GroupScheduleButchCreateSchema,
+    cancel_check: CancelCheck | None = None,
 ):
     today = date.today()
     if data.start_date <= today:
@@ -317,31 +362,17 @@ async def create_butch_group_schedules(
         raise Exception("Could not find any cabinets")
     cabinet_ids = [cab.id for cab in cabinets]
 
-    group_schedules = list(await get_all_group_schedules_by_instructor_id_for_dates(
-        session, group.instructor_id, data.start_date, data.end_date
-    ))
-    for cabinet_id in cabinet_ids:
-        group_schedules.extend(list(await get_all_group_schedules_by_cabinet_id_for_dates(
-            session, cabinet_id, data.start_date, data.end_date
-        )))
-
-    existing_group_schedules = []
-    for group_schedule in group_schedules:
-        existing_group_schedules.append(ExistingGroupScheduleSchema(
-            date=group_schedule.date,
-            start_time=group_schedule.start_time,
-            end_time=group_schedule.end_time,
-            group_id=group_schedule.group_id,
-            cabinet_id=group_schedule.cabinet_id,
-            instructor_id=group.instructor_id
-        ))
-
-    from crud.practice_schedule import get_all_practice_schedules_by_instructor_id_for_dates
-    existing_practice_schedules = list(await get_all_practice_schedules_by_instructor_id_for_dates(
-        session, group.instructor_id, data.start_date, data.end_date
-    ))
-
-    result = generate_group_schedule(
+    existing_group_schedules = await load_existing_group_schedules(
+        session, data.start_date, data.end_date,
+        group_ids=[group.id], instructor_ids=[group.instructor_id], cabinet_ids=cabinet_ids
+    )
+    existing_practice_schedules = await load_existing_practice_schedules(
+        session, data.start_date, data.end_date, instructor_ids=[group.instructor_id]
+    )
+
+    result, statistics = await run_generator(
+        generate_group_schedule,
+        cancel_check=cancel_check,
         group=GroupForScheduleSchema(id=group.id, instructor_id=group.instructor_id),
         cabinet_ids=cabinet_ids,
         existing_group_schedules=existing_group_schedules,
@@ -354,12 +385,113 @@ async def create_butch_group_schedules(
         schedule_count=schedule_count,
         schedules_per_day=data.schedules_per_day,
         include_weekends=data.include_weekends,
+        allow_partial=data.allow_partial,
     )
-    for item in result:
-        print(item)
+    schedule_ids = await bulk_insert_schedules(session, GroupSchedule, result, SCHEDULE_CONFLICT_MESSAGES)
 
-        schedule = GroupSchedule(**item.model_dump())
-        session.add(schedule)
-        await session.commit()
+    if statistics.generated_count < statistics.requested_count:
+        detail = (f"Created {statistics.generated_count}/{statistics.requested_count} group schedules, "
+                  f"{get_extension_hint(statistics)}")
+    else:
+        detail = "Created group schedules"
+
+    return {"success": True, "detail": detail, "statistics": statistics.model_dump(), "ids": schedule_ids}
+
+
+async def create_butch_school_group_schedules(
+    session: AsyncSession,
+    data: GroupScheduleSchoolButchCreateSchema,
+    cancel_check: CancelCheck | None = None,
+):
+    today = date.today()
+    if data.start_date <= today:
+        raise Exception(f"Wrong date: date should be at least tomorrow ({today + timedelta(days=1)})")
+    if data.start_date > data.end_date:
+        raise Exception(f"Wrong date: end date should be lower or equal to start date ({data.start_date})")
+
+    if data.group_ids is None:
+        groups = list(await get_groups_without_schedules(session))
+    else:
+        groups = [await get_group_by_id(session, group_id) for group_id in dict.fromkeys(data.group_ids)]
+    if not groups:
+        raise Exception("Could not find any groups without schedules")
+
+    start_time = settings.working_info.working_start_time
+    end_time = settings.working_info.working_end_time
+    category_levels = {cl.id: cl for cl in await get_all_category_levels(session)}
+
+    result = await session.execute(
+        select(GroupSchedule.group_id, func.count())
+        .where(GroupSchedule.group_id.in_([g.id for g in groups]))
+        .group_by(GroupSchedule.group_id)
+    )
+    existing_counts = dict(result.all())
+
+    schedule_counts = {}
+    schedule_durations = {}
+    for group in groups:
+        category_level_info = category_levels[group.category_level_id].category_level_info
+        schedule_count = category_level_info.theory_lessons_count - existing_counts.get(group.id, 0)
+        if schedule_count > 0:
+            schedule_counts[group.id] = schedule_count
+            schedule_durations[group.id] = category_level_info.theory_lessons_duration
+    if not schedule_counts:
+        raise Exception("Groups already have all group schedules")
+
+    # A group without an instructor can not get lessons, it is reported instead of failing the whole run
+    skipped_ids = sorted(group.id for group in groups if group.id in schedule_counts and not group.instructor_id)
+    for group_id in skipped_ids:
+        del schedule_counts[group_id]
+    if not schedule_counts:
+        raise Exception(f"Groups have no instructor: {', '.join(map(str, skipped_ids))}")
+
+    groups_for_schedule = [
+        GroupForScheduleSchema(id=group.id, instructor_id=group.instructor_id)
+        for group in groups if group.id in schedule_counts
+    ]
+    instructor_ids = list({group.instructor_id for group in groups_for_schedule})
+
+    cabinets = await get_all_cabinets(session)
+    if not cabinets:
+        raise Exception("Could not find any cabinets")
+    cabinet_ids = [cab.id for cab in cabinets]
+
+    existing_group_schedules = await load_existing_group_schedules(
+        session, data.start_date, data.end_date,
+        group_ids=schedule_counts, instructor_ids=instructor_ids, cabinet_ids=cabinet_ids
+    )
+    existing_practice_schedules = await load_existing_practice_schedules(
+        session, data.start_date, data.end_date, instructor_ids=instructor_ids
+    )
+
+    result, statistics = await run_generator(
+        generate_school_group_schedule,
+        cancel_check=cancel_check,
+        groups=groups_for_schedule,
+        schedule_counts=schedule_counts,
+        schedule_durations=schedule_durations,
+        cabinet_ids=cabinet_ids,
+        existing_group_schedules=existing_group_schedules,
+        existing_practice_schedules=existing_practice_schedules,
+        start_date=data.start_date,
+        end_date=data.end_date,
+        schedule_start_time=start_time,
+        schedule_end_time=end_time,
+        schedules_per_day=data.schedules_per_day,
+        include_weekends=data.include_weekends,
+        allow_partial=data.allow_partial,
+    )
+    statistics.skipped_ids = skipped_ids
+
+    schedule_ids = await bulk_insert_schedules(session, GroupSchedule, result, SCHEDULE_CONFLICT_MESSAGES)
+
+    detail = (f"Created {statistics.generated_count} group schedules for "
+              f"{statistics.scheduled_groups_count}/{statistics.groups_count} groups "
+              f"({statistics.groups_per_second} groups/s, "
+              f"cabinet utilization {statistics.average_cabinet_utilization:.0%})")
+    if statistics.generated_count < statistics.requested_count:
+        detail += f", {get_extension_hint(statistics)}"
+    if skipped_ids:
+        detail += f", groups without an instructor were skipped: {', '.join(map(str, skipped_ids))}"
 
-    return {"success": True, "detail": "Created group schedules"}
+    return {"success": True, "detail": detail, "statistics": statistics.model_dump(), "ids": schedule_ids}
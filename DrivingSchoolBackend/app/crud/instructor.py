@@ -5,12 +5,14 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, text, asc, desc, or_
 from sqlalchemy.orm import selectinload, joinedload
 
-from core.models import User, Instructor, InstructorCategoryLevel
+from core.models import db_helper, User, Instructor, InstructorCategoryLevel
 from core.schemas.instructor import InstructorCreateSchema, InstructorUpdateSchema
-from auth.utils import hash_password
+from auth.utils import hash_password_async, hash_password_if_changed
 from core.schemas.profile import InstructorProfileSchema, CategoryLevelProfileSchema
+from core.config import settings
 from crud.category_level import get_category_level_by_id
-from crud.user import get_user_by_username, get_user_by_phone_number
+from crud.role_provisioning import RoleProvisioner
+from crud.user import get_user_by_username, get_user_by_phone_number, invalidate_user_role
 
 
 async def create_instructor(session: AsyncSession, data: InstructorCreateSchema):
@@ -35,7 +37,7 @@ async def create_instructor(session: AsyncSession, data: InstructorCreateSchema)
         patronymic=data.user.patronymic,
         birthday=data.user.birthday,
         phone_number=data.user.phone_number,
-        hashed_password=hash_password(data.password),
+        hashed_password=await hash_password_async(data.password),
     )
     session.add(user)
     await session.flush()
@@ -46,16 +48,12 @@ async def create_instructor(session: AsyncSession, data: InstructorCreateSchema)
     )
     session.add(instructor)
 
-    create_query = text(f"""
-        CREATE USER "{data.user.username}" WITH PASSWORD '{data.password}';
-    """)
-    grant_query = text(f"""
-        GRANT instructor_role TO "{data.user.username}";
-    """)
-    await session.execute(create_query)
-    await session.execute(grant_query)
+    provisioner = RoleProvisioner()
+    provisioner.add(data.user.username, data.password, settings.roles.instructor)
+    await provisioner.flush(session)
 
     await session.commit()
+    invalidate_user_role(data.user.username)
 
     await session.refresh(instructor)
 
@@ -110,19 +108,25 @@ async def update_instructor(session: AsyncSession, instructor_id: int, data: Ins
     user.birthday = data.user.birthday
     user.phone_number = data.user.phone_number
 
+    password_changed = False
     if data.password:
-        new_hashed_password = hash_password(data.password)
+        new_hashed_password = await hash_password_if_changed(data.password, user.hashed_password)
 
-        if user.hashed_password != new_hashed_password:
+        if new_hashed_password:
             user.hashed_password = new_hashed_password
 
             query = text(f"""
                 ALTER USER "{user.username}" WITH PASSWORD '{data.password}';
             """)
             await session.execute(query)
+            password_changed = True
 
     await session.commit()
+    # Refreshed before the engines are dropped: a user changing their own password works through
+    # one of them, and a new connection would be opened with the old password from the token
     await session.refresh(instructor)
+    if password_changed:
+        await db_helper.user_engines.discard_user(user.username)
     return instructor
 
 
@@ -0,0 +1,177 @@
+from datetime import timedelta
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, update, or_, and_, func, case
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.models import Job
+
+# progress(fraction from 0 to 1, message)
+ProgressCallback = Callable[[float, str], Awaitable[None]]
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+async def enqueue_job(session: AsyncSession, kind: str, payload: dict | None, username: str):
+    job = Job(kind=kind, payload=payload, username=username, status="queued")
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+    return job
+
+
+# Jobs run on the main engine under SET LOCAL ROLE of the user who enqueued them
+async def can_run_jobs_as(session: AsyncSession, role: str) -> bool:
+    try:
+        result = await session.execute(select(func.pg_has_role(role, "MEMBER")))
+        return bool(result.scalar_one())
+    except DBAPIError:
+        # No such role
+        await session.rollback()
+        return False
+
+
+async def get_job_by_id(session: AsyncSession, job_id: int, username: str | None = None):
+    result = await session.execute(select(Job).where(Job.id == job_id))
+    job = result.scalar_one_or_none()
+    # Jobs of other users are reported as missing, admins see every job (username=None)
+    if not job or (username is not None and job.username != username):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+async def get_jobs_by_username(session: AsyncSession, username: str, limit: int = 20):
+    result = await session.execute(
+        select(Job)
+        .where(Job.username == username)
+        .order_by(Job.id.desc())
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
+# Takes the oldest queued job, or a running job whose worker stopped sending heartbeats.
+# FOR UPDATE SKIP LOCKED lets any number of workers (and app processes) poll the table
+# without blocking each other or claiming the same job
+async def claim_job(session: AsyncSession, worker_id: str):
+    stale_before = func.now() - timedelta(seconds=settings.jobs.stale_timeout)
+    candidate = (
+        select(Job.id)
+        .where(
+            or_(
+                Job.status == "queued",
+                and_(Job.status == "running", Job.heartbeat_at < stale_before),
+            ),
+            Job.attempts < settings.jobs.max_attempts,
+            Job.cancel_requested.is_(False),
+        )
+        .order_by(Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        update(Job)
+        .where(Job.id == candidate)
+        .values(
+            status="running",
+            worker_id=worker_id,
+            attempts=Job.attempts + 1,
+            started_at=func.now(),
+            heartbeat_at=func.now(),
+        )
+        .returning(Job)
+    )
+    job = result.scalar_one_or_none()
+    await session.commit()
+    return job
+
+
+# Finishes abandoned running jobs that will not be claimed again (out of attempts or cancelled),
+# so they do not stay "running" forever. Returns their payloads, so uploads they refer to can be removed
+async def finish_abandoned_jobs(session: AsyncSession) -> list[dict | None]:
+    stale_before = func.now() - timedelta(seconds=settings.jobs.stale_timeout)
+    result = await session.execute(
+        select(Job.id, Job.payload)
+        .where(
+            Job.status == "running",
+            Job.heartbeat_at < stale_before,
+            or_(Job.attempts >= settings.jobs.max_attempts, Job.cancel_requested.is_(True)),
+        )
+        .with_for_update(skip_locked=True)
+    )
+    abandoned = result.all()
+    if abandoned:
+        await session.execute(
+            update(Job)
+            .where(Job.id.in_([job_id for job_id, _ in abandoned]))
+            .values(
+                status=case((Job.cancel_requested.is_(True), "cancelled"), else_="failed"),
+                error=case((Job.cancel_requested.is_(True), None), else_="Job was abandoned by its workers"),
+                payload=None,
+                finished_at=func.now(),
+            )
+        )
+    await session.commit()
+    return [payload for _, payload in abandoned]
+
+
+# Heartbeat of a running job, returns True if cancellation was requested
+async def touch_job(
+    session: AsyncSession,
+    job_id: int,
+    progress: float | None = None,
+    progress_message: str | None = None,
+) -> bool:
+    values = {"heartbeat_at": func.now()}
+    if progress is not None:
+        values["progress"] = progress
+        values["progress_message"] = progress_message
+
+    result = await session.execute(
+        update(Job)
+        .where(Job.id == job_id)
+        .values(**values)
+        .returning(Job.cancel_requested)
+    )
+    cancel_requested = result.scalar_one_or_none()
+    await session.commit()
+    return bool(cancel_requested)
+
+
+async def finish_job(
+    session: AsyncSession,
+    job_id: int,
+    job_status: str,
+    result: dict | None = None,
+    error: str | None = None,
+):
+    # Payloads are only needed to run the job
+    values = {"status": job_status, "result": result, "error": error, "payload": None, "finished_at": func.now()}
+    if job_status == "succeeded":
+        values["progress"] = 1.0
+
+    await session.execute(update(Job).where(Job.id == job_id).values(**values))
+    await session.commit()
+
+
+async def cancel_job(session: AsyncSession, job_id: int, username: str | None = None):
+    job = await get_job_by_id(session, job_id, username)
+    if job.status in FINISHED_STATUSES:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is already {job.status}")
+
+    # A queued job is cancelled right away (unless a worker claimed it meanwhile),
+    # a running one stops at its next cancel check
+    await session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "queued")
+        .values(status="cancelled", payload=None, finished_at=func.now())
+    )
+    await session.execute(update(Job).where(Job.id == job_id).values(cancel_requested=True))
+    await session.commit()
+
+    await session.refresh(job)
+    return job
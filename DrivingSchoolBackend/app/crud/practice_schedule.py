@@ -1,76 +1,39 @@
+from collections import defaultdict
 from datetime import date, timedelta
 
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, and_, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from sqlalchemy.orm import joinedload
 
 from core.config import settings
-from core.models import PracticeSchedule, Instructor, Student
-from core.schemas.group_schedule import ExistingGroupScheduleSchema
-from core.schemas.practice_schedule import PracticeScheduleSchema, PracticeScheduleCreateSchema, \
-    PracticeScheduleUpdateSchema, PracticeScheduleButchCreateSchema, StudentForScheduleSchema
+from core.models import PracticeSchedule, Instructor, Student, Vehicle, InstructorCategoryLevel, GroupSchedule
+from core.schemas.practice_schedule import PracticeScheduleCreateSchema, \
+    PracticeScheduleUpdateSchema, PracticeScheduleButchCreateSchema, StudentForScheduleSchema, \
+    PracticeScheduleGroupButchCreateSchema, PracticeScheduleValidateBatchSchema
+from core.schemas.schedule_validation import ScheduleValidationItemSchema, ScheduleValidationBatchResultSchema
 from core.schemas.profile_schedule import StudentProfileScheduleSchema, InstructorProfileScheduleSchema
 from crud.category_level import get_category_level_by_id
 from crud.instructor import get_instructor_by_id
 from crud.instructor_category import get_instructor_categories
-from crud.student import get_student_by_id
+from crud.group import get_group_by_id
+from crud.schedule_conflict import get_instructor_conflict, get_practice_batch_conflicts, find_batch_overlaps, \
+    INSTRUCTOR_CONFLICT_MESSAGES
+from crud.schedule_context import load_existing_group_schedules, load_existing_practice_schedules
+from crud.schedule_persistence import bulk_insert_schedules, raise_schedule_conflict
+from crud.student import get_student_by_id, get_students_by_group_id
 from crud.vehicle import get_vehicle_by_id, get_all_vehicles_by_category_level
-from schedule_generators.practice_schedule import generate_practice_schedule
+from schedule_generators.common import get_extension_hint
+from schedule_generators.practice_schedule import generate_practice_schedule, generate_joint_practice_schedule
+from schedule_generators.runner import run_generator, CancelCheck
 
 
-async def check_schedule_conflict(session: AsyncSession, data: PracticeScheduleSchema, schedule_id: int | None = None):
-    filters = [
-        PracticeSchedule.date == data.date,
-        or_(
-            and_(PracticeSchedule.start_time <= data.start_time, PracticeSchedule.end_time > data.start_time),
-            and_(PracticeSchedule.start_time < data.end_time, PracticeSchedule.end_time >= data.end_time),
-            and_(PracticeSchedule.start_time >= data.start_time, PracticeSchedule.end_time <= data.end_time),
-        )
-    ]
-    if schedule_id:
-        exclude_self = PracticeSchedule.id != schedule_id
-    else:
-        exclude_self = True
-
-    # Instructor
-    instructor_query = select(PracticeSchedule).where(
-        and_(
-            *filters,
-            PracticeSchedule.instructor_id == data.instructor_id,
-            exclude_self
-        )
-    )
-
-    # Vehicle
-    vehicle_query = select(PracticeSchedule).where(
-        and_(
-            *filters,
-            PracticeSchedule.vehicle_id == data.vehicle_id,
-            exclude_self
-        )
-    )
-
-    # Student
-    student_query = select(PracticeSchedule).where(
-        and_(
-            *filters,
-            PracticeSchedule.student_id == data.student_id,
-            exclude_self
-        )
-    )
-
-    instructor_result = await session.execute(instructor_query)
-    vehicle_result = await session.execute(vehicle_query)
-    student_result = await session.execute(student_query)
-
-    if instructor_result.scalars().all():
-        return "instructor"
-    if vehicle_result.scalars().all():
-        return "vehicle"
-    if student_result.scalars().all():
-        return "student"
-    return None
+SCHEDULE_CONFLICT_MESSAGES = {
+    "ex_practice_schedule_instructor_id": "Schedule conflict detected: this instructor already has a lesson at that time",
+    "ex_practice_schedule_vehicle_id": "Schedule conflict detected: this vehicle already has a lesson at that time",
+    "ex_practice_schedule_student_id": "Schedule conflict detected: this student already has a lesson at that time",
+}
 
 
 async def create_practice_schedule(session: AsyncSession, data: PracticeScheduleCreateSchema):
@@ -120,26 +83,22 @@ async def create_practice_schedule(session: AsyncSession, data: PracticeSchedule
             detail=f"Wrong date: date should be at least the next day after last group schedule ({max_group_schedule_date})"
         )
 
-    conflict_type = await check_schedule_conflict(session, data)
-    if conflict_type == "instructor":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Schedule conflict detected: this instructor already has a lesson at that time"
-        )
-    elif conflict_type == "vehicle":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Schedule conflict detected: this vehicle already has a lesson at that time"
-        )
-    elif conflict_type == "student":
+    conflict_type = await get_instructor_conflict(
+        session, data.instructor_id, data.date, data.start_time, data.end_time
+    )
+    if conflict_type:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Schedule conflict detected: this student already has a lesson at that time"
+            detail=INSTRUCTOR_CONFLICT_MESSAGES[conflict_type]
         )
 
     schedule = PracticeSchedule(**data.model_dump())
     session.add(schedule)
-    await session.commit()
+    try:
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        raise_schedule_conflict(e, SCHEDULE_CONFLICT_MESSAGES)
     await session.refresh(schedule)
     return schedule
 
@@ -199,31 +158,124 @@ async def update_practice_schedule(session: AsyncSession, schedule_id: int, data
             detail=f"Wrong date: date should be at least the next day after last group schedule ({max_group_schedule_date})"
         )
 
-    conflict_type = await check_schedule_conflict(session, data, schedule_id=schedule_id)
-    if conflict_type == "instructor":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Schedule conflict detected: this instructor already has a lesson at that time"
-        )
-    elif conflict_type == "vehicle":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Schedule conflict detected: this vehicle already has a lesson at that time"
-        )
-    elif conflict_type == "student":
+    conflict_type = await get_instructor_conflict(
+        session, data.instructor_id, data.date, data.start_time, data.end_time,
+        practice_schedule_id=schedule_id
+    )
+    if conflict_type:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Schedule conflict detected: this student already has a lesson at that time"
+            detail=INSTRUCTOR_CONFLICT_MESSAGES[conflict_type]
         )
 
     for field, value in data.model_dump().items():
         setattr(schedule, field, value)
 
-    await session.commit()
+    try:
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        raise_schedule_conflict(e, SCHEDULE_CONFLICT_MESSAGES)
     await session.refresh(schedule)
     return schedule
 
 
+async def validate_practice_schedules(session: AsyncSession, data: PracticeScheduleValidateBatchSchema):
+    lessons = data.lessons
+    instructor_ids = {lesson.instructor_id for lesson in lessons}
+    vehicle_ids = {lesson.vehicle_id for lesson in lessons}
+    student_ids = {lesson.student_id for lesson in lessons}
+
+    # Everything the create endpoint looks up one lesson at a time, loaded once for the whole batch
+    result = await session.execute(select(Instructor.id).where(Instructor.id.in_(instructor_ids)))
+    instructors = set(result.scalars().all())
+
+    result = await session.execute(
+        select(Vehicle.id, Vehicle.category_level_id).where(Vehicle.id.in_(vehicle_ids))
+    )
+    vehicle_categories = dict(result.all())
+
+    result = await session.execute(
+        select(Student.id, Student.category_level_id, Student.group_id).where(Student.id.in_(student_ids))
+    )
+    students = {row.id: row for row in result.all()}
+
+    result = await session.execute(
+        select(InstructorCategoryLevel.instructor_id, InstructorCategoryLevel.category_level_id)
+        .where(InstructorCategoryLevel.instructor_id.in_(instructor_ids))
+    )
+    instructor_categories = defaultdict(set)
+    for instructor_id, category_level_id in result.all():
+        instructor_categories[instructor_id].add(category_level_id)
+
+    group_ids = {student.group_id for student in students.values() if student.group_id}
+    result = await session.execute(
+        select(GroupSchedule.group_id, func.max(GroupSchedule.date))
+        .where(GroupSchedule.group_id.in_(group_ids))
+        .group_by(GroupSchedule.group_id)
+    )
+    max_group_schedule_dates = dict(result.all())
+
+    timed_lessons = [(index, lesson) for index, lesson in enumerate(lessons) if lesson.start_time < lesson.end_time]
+    conflicts = await get_practice_batch_conflicts(session, timed_lessons)
+    batch_overlaps = find_batch_overlaps([
+        (index, kind, getattr(lesson, f"{kind}_id"), lesson.date, lesson.start_time, lesson.end_time)
+        for index, lesson in timed_lessons
+        for kind in ("instructor", "vehicle", "student")
+    ])
+
+    today = date.today()
+    items = []
+    for index, lesson in enumerate(lessons):
+        errors = []
+        if lesson.date <= today:
+            errors.append(f"Wrong date: date should be at least tomorrow ({today + timedelta(days=1)})")
+        if lesson.start_time >= lesson.end_time:
+            errors.append("Wrong time: end time should be greater than start time")
+
+        student = students.get(lesson.student_id)
+        vehicle_category_level_id = vehicle_categories.get(lesson.vehicle_id)
+        if lesson.instructor_id not in instructors:
+            errors.append("Instructor not found")
+        if vehicle_category_level_id is None:
+            errors.append("Vehicle not found")
+        if student is None:
+            errors.append("Student not found")
+
+        if student is not None:
+            if vehicle_category_level_id is not None and student.category_level_id != vehicle_category_level_id:
+                errors.append("Vehicle has no such category level")
+            if (lesson.instructor_id in instructors
+                    and student.category_level_id not in instructor_categories[lesson.instructor_id]):
+                errors.append("Instructor has no such category level")
+
+            max_group_schedule_date = max_group_schedule_dates.get(student.group_id)
+            if not max_group_schedule_date:
+                errors.append("Student has no group schedule, cannot create practice schedule")
+            elif max_group_schedule_date >= lesson.date:
+                errors.append(
+                    f"Wrong date: date should be at least the next day after last group schedule ({max_group_schedule_date})"
+                )
+
+        for kind in conflicts.get(index, []):
+            if kind == "instructor_group":
+                errors.append(INSTRUCTOR_CONFLICT_MESSAGES["group"])
+            else:
+                errors.append(SCHEDULE_CONFLICT_MESSAGES[f"ex_practice_schedule_{kind}_id"])
+        for kind, other in batch_overlaps.get(index, []):
+            errors.append(f"Schedule conflict detected: this {kind} has lesson {other} of this batch at that time")
+
+        items.append(ScheduleValidationItemSchema(index=index, valid=not errors, errors=errors))
+
+    valid_count = sum(item.valid for item in items)
+    return ScheduleValidationBatchResultSchema(
+        valid=valid_count == len(items),
+        valid_count=valid_count,
+        invalid_count=len(items) - valid_count,
+        items=items,
+    )
+
+
 async def get_practice_schedule_by_id(session: AsyncSession, schedule_id: int):
     result = await session.execute(select(PracticeSchedule).where(PracticeSchedule.id == schedule_id))
     practice_schedule = result.scalar_one_or_none()
@@ -342,6 +394,7 @@ async def get_practice_schedules_by_instructor_and_date(session, instructor_id:
 async def create_butch_practice_schedules(
     session: AsyncSession,
     data: PracticeScheduleButchCreateSchema,
+    cancel_check: CancelCheck | None = None,
 ):
     today = date.today()
     if data.start_date <= today:
@@ -389,31 +442,17 @@ async def create_butch_practice_schedules(
             f"({max_group_schedule_date})"
         )
 
-    from crud.group_schedule import get_all_group_schedules_by_instructor_id_for_dates
-    group_schedules = list(await get_all_group_schedules_by_instructor_id_for_dates(
-        session, data.instructor_id, data.start_date, data.end_date
-    ))
-    existing_group_schedules = []
-    for group_schedule in group_schedules:
-        existing_group_schedules.append(ExistingGroupScheduleSchema(
-            date=group_schedule.date,
-            start_time=group_schedule.start_time,
-            end_time=group_schedule.end_time,
-            group_id=group_schedule.group_id,
-            cabinet_id=group_schedule.cabinet_id,
-            instructor_id=data.instructor_id
-        ))
-
-    existing_practice_schedules = list(await get_all_practice_schedules_by_instructor_id_for_dates(
-        session, data.instructor_id, data.start_date, data.end_date
-    ))
-
-    for vehicle_id in vehicle_ids:
-        existing_practice_schedules.extend(list(await get_all_practice_schedules_by_vehicle_id_for_dates(
-            session, vehicle_id, data.start_date, data.end_date
-        )))
-
-    result = generate_practice_schedule(
+    existing_group_schedules = await load_existing_group_schedules(
+        session, data.start_date, data.end_date, instructor_ids=[data.instructor_id]
+    )
+    existing_practice_schedules = await load_existing_practice_schedules(
+        session, data.start_date, data.end_date,
+        student_ids=[student.id], instructor_ids=[data.instructor_id], vehicle_ids=vehicle_ids
+    )
+
+    result, statistics = await run_generator(
+        generate_practice_schedule,
+        cancel_check=cancel_check,
         student=StudentForScheduleSchema(id=student.id, instructor_id=data.instructor_id),
         vehicle_ids=vehicle_ids,
         existing_group_schedules=existing_group_schedules,
@@ -426,12 +465,136 @@ async def create_butch_practice_schedules(
         schedule_count=schedule_count,
         schedules_per_day=data.schedules_per_day,
         include_weekends=data.include_weekends,
+        allow_partial=data.allow_partial,
     )
-    for item in result:
-        print(item)
+    schedule_ids = await bulk_insert_schedules(session, PracticeSchedule, result, SCHEDULE_CONFLICT_MESSAGES)
 
-        schedule = PracticeSchedule(**item.model_dump())
-        session.add(schedule)
-        await session.commit()
+    if statistics.generated_count < statistics.requested_count:
+        detail = (f"Created {statistics.generated_count}/{statistics.requested_count} practice schedules, "
+                  f"{get_extension_hint(statistics)}")
+    else:
+        detail = "Created practice schedules"
+
+    return {"success": True, "detail": detail, "statistics": statistics.model_dump(), "ids": schedule_ids}
+
+
+async def create_butch_group_practice_schedules(
+    session: AsyncSession,
+    data: PracticeScheduleGroupButchCreateSchema,
+    cancel_check: CancelCheck | None = None,
+):
+    today = date.today()
+    if data.start_date <= today:
+        raise Exception(f"Wrong date: date should be at least tomorrow ({today + timedelta(days=1)})")
+    if data.start_date > data.end_date:
+        raise Exception(f"Wrong date: end date should be lower or equal to start date ({data.start_date})")
+
+    group = await get_group_by_id(session, data.group_id)
+
+    students = list(await get_students_by_group_id(session, group.id))
+    if data.student_ids is not None:
+        group_student_ids = {st.id for st in students}
+        for student_id in data.student_ids:
+            if student_id not in group_student_ids:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Student {student_id} is not in the group"
+                )
+        requested_ids = set(data.student_ids)
+        students = [st for st in students if st.id in requested_ids]
+    if not students:
+        raise Exception("Group has no students, cannot create practice schedules")
+
+    category_level_ids = {st.category_level_id for st in students}
+    if len(category_level_ids) > 1:
+        raise Exception("Students have different category levels, schedule them separately")
+    category_level_id = category_level_ids.pop()
+
+    instructor_ids = list(dict.fromkeys(data.instructor_ids))
+    for instructor_id in instructor_ids:
+        instructor_categories = await get_instructor_categories(session, instructor_id)
+        if category_level_id not in [ic.id for ic in instructor_categories]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Instructor {instructor_id} has no such category level"
+            )
+
+    start_time = settings.working_info.working_start_time
+    end_time = settings.working_info.working_end_time
+    category_level = await get_category_level_by_id(session, category_level_id)
+    schedule_duration = category_level.category_level_info.practice_lessons_duration
+    schedule_count = category_level.category_level_info.practice_lessons_count
+
+    from crud.group_schedule import get_max_schedule_date_by_group_id
+    max_group_schedule_date = await get_max_schedule_date_by_group_id(session, group.id)
+    if not max_group_schedule_date:
+        raise Exception("Group has no group schedules, cannot create practice schedules")
+    elif max_group_schedule_date >= data.start_date:
+        raise Exception(
+            f"Wrong date: date should be at least the next day after group`s last group schedule "
+            f"({max_group_schedule_date})"
+        )
+
+    student_ids = [st.id for st in students]
+    result = await session.execute(
+        select(PracticeSchedule)
+        .where(PracticeSchedule.student_id.in_(student_ids))
+    )
+    students_practice_schedules = list(result.scalars().all())
+    existing_counts = {student_id: 0 for student_id in student_ids}
+    for p in students_practice_schedules:
+        existing_counts[p.student_id] += 1
+
+    schedule_counts = {
+        student_id: schedule_count - existing_count
+        for student_id, existing_count in existing_counts.items()
+        if existing_count < schedule_count
+    }
+    if not schedule_counts:
+        raise Exception(f"Students already have {schedule_count} practice schedules")
+
+    students_for_schedule = [
+        StudentForScheduleSchema(id=student_id, instructor_id=instructor_ids[i % len(instructor_ids)])
+        for i, student_id in enumerate(schedule_counts)
+    ]
+
+    vehicles = await get_all_vehicles_by_category_level(session, category_level_id)
+    if not vehicles:
+        raise Exception("Could not find any vehicles for this category level")
+    vehicle_ids = [vec.id for vec in vehicles]
+
+    existing_group_schedules = await load_existing_group_schedules(
+        session, data.start_date, data.end_date, instructor_ids=instructor_ids
+    )
+    existing_practice_schedules = await load_existing_practice_schedules(
+        session, data.start_date, data.end_date,
+        student_ids=student_ids, instructor_ids=instructor_ids, vehicle_ids=vehicle_ids
+    )
+
+    result, statistics = await run_generator(
+        generate_joint_practice_schedule,
+        cancel_check=cancel_check,
+        students=students_for_schedule,
+        schedule_counts=schedule_counts,
+        vehicle_ids=vehicle_ids,
+        existing_group_schedules=existing_group_schedules,
+        existing_practice_schedules=existing_practice_schedules,
+        start_date=data.start_date,
+        end_date=data.end_date,
+        schedule_start_time=start_time,
+        schedule_end_time=end_time,
+        schedule_duration=schedule_duration,
+        schedules_per_day=data.schedules_per_day,
+        include_weekends=data.include_weekends,
+        allow_partial=data.allow_partial,
+    )
+
+    schedule_ids = await bulk_insert_schedules(session, PracticeSchedule, result, SCHEDULE_CONFLICT_MESSAGES)
+
+    if statistics.generated_count < statistics.requested_count:
+        detail = (f"Created {statistics.generated_count}/{statistics.requested_count} practice schedules "
+                  f"for {len(students_for_schedule)} students, {get_extension_hint(statistics)}")
+    else:
+        detail = f"Created practice schedules for {len(students_for_schedule)} students"
 
-    return {"success": True, "detail": "Created practice schedules"}
+    return {"success": True, "detail": detail, "statistics": statistics.model_dump(), "ids": schedule_ids}
@@ -0,0 +1,71 @@
+import secrets
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+
+
+def quote_literal(value: str) -> str:
+    if "\x00" in value:
+        raise ValueError("Value must not contain NUL characters")
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _array_literal(values: list[str]) -> str:
+    return f"ARRAY[{', '.join(quote_literal(v) for v in values)}]::text[]"
+
+
+class RoleProvisioner:
+    """Collects database users to create and creates them in a single DO block.
+
+    Values are embedded as quoted literals and turned into identifiers/literals
+    by format('%I', '%L') on the server, so every user costs no extra round trip.
+    """
+
+    def __init__(self):
+        self._pending: list[tuple[str, str, str]] = []
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, username: str, password: str, role: str):
+        self._pending.append((username, password, role))
+
+    def build_statement(self) -> str:
+        usernames = [username for username, _, _ in self._pending]
+        passwords = [password for _, password, _ in self._pending]
+        roles = [role for _, _, role in self._pending]
+
+        # In "set_role" session mode the main DB user must be able to SET ROLE to the new user
+        grant_to_session_user = ""
+        if settings.db.session_mode == "set_role":
+            grant_to_session_user = "EXECUTE format('GRANT %I TO %I', usernames[i], session_user);"
+
+        body = f"""
+            DECLARE
+                usernames text[] := {_array_literal(usernames)};
+                passwords text[] := {_array_literal(passwords)};
+                roles text[] := {_array_literal(roles)};
+            BEGIN
+                FOR i IN 1 .. array_length(usernames, 1) LOOP
+                    EXECUTE format('CREATE USER %I WITH PASSWORD %L', usernames[i], passwords[i]);
+                    EXECUTE format('GRANT %I TO %I', roles[i], usernames[i]);
+                    {grant_to_session_user}
+                END LOOP;
+            END
+        """
+
+        tag = "$provision$"
+        while tag in body:
+            tag = f"$provision_{secrets.token_hex(4)}$"
+
+        return f"DO {tag}{body}{tag};"
+
+    async def flush(self, session: AsyncSession):
+        if not self._pending:
+            return
+
+        # exec_driver_sql, so that ':' in passwords is never treated as a bind parameter
+        connection = await session.connection()
+        await connection.exec_driver_sql(self.build_statement())
+        self._pending.clear()
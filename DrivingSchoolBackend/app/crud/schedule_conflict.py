@@ -0,0 +1,197 @@
+from collections import defaultdict
+from datetime import date, time, datetime
+from itertools import groupby
+
+from sqlalchemy import select, literal, union_all, true, func, values, column, Integer, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.models import GroupSchedule, Group, PracticeSchedule
+
+INSTRUCTOR_CONFLICT_MESSAGES = {
+    "practice": "Schedule conflict detected: this instructor already has a lesson at that time",
+    "group": "Schedule conflict detected: this instructor already has a group lesson at that time",
+}
+
+
+def _overlaps(model, lesson_date: date, start_time: time, end_time: time):
+    # Probed through the gist indexes of the exclusion constraints on (resource id, time_range)
+    lesson_range = func.tsrange(datetime.combine(lesson_date, start_time), datetime.combine(lesson_date, end_time))
+    return model.time_range.overlaps(lesson_range)
+
+
+# An instructor teaches practice lessons directly and theory lessons through group.instructor_id,
+# which no constraint of a single table can see. Both tables are probed in one round trip:
+# UNION ALL under LIMIT 1 stops at the first hit, practice lessons are checked first.
+# Returns the kind of the conflicting lesson ("practice" or "group") or None.
+# The lesson being updated is skipped by its id, group_id skips the lessons of the group
+# itself (those are reported by the group constraint)
+async def get_instructor_conflict(
+    session: AsyncSession,
+    instructor_id: int,
+    lesson_date: date,
+    start_time: time,
+    end_time: time,
+    practice_schedule_id: int | None = None,
+    group_schedule_id: int | None = None,
+    group_id: int | None = None,
+) -> str | None:
+    practice_query = (
+        select(literal("practice").label("kind"))
+        .where(
+            PracticeSchedule.instructor_id == instructor_id,
+            _overlaps(PracticeSchedule, lesson_date, start_time, end_time),
+            PracticeSchedule.id != practice_schedule_id if practice_schedule_id else true(),
+        )
+    )
+    group_query = (
+        select(literal("group").label("kind"))
+        .select_from(GroupSchedule)
+        .join(Group, Group.id == GroupSchedule.group_id)
+        .where(
+            Group.instructor_id == instructor_id,
+            _overlaps(GroupSchedule, lesson_date, start_time, end_time),
+            GroupSchedule.id != group_schedule_id if group_schedule_id else true(),
+            GroupSchedule.group_id != group_id if group_id else true(),
+        )
+    )
+
+    result = await session.execute(union_all(practice_query, group_query).limit(1))
+    return result.scalar_one_or_none()
+
+
+# Proposed lessons of a validation batch as a VALUES list (sent once, as a CTE) that is joined
+# to the schedule tables. lessons: (index in the batch, lesson, resource ids in the order of id_columns)
+def _proposed_lessons(lessons: list[tuple[int, object, tuple]], id_columns: list[str]):
+    proposed = values(
+        column("idx", Integer),
+        *(column(name, Integer) for name in id_columns),
+        column("starts_at", DateTime),
+        column("ends_at", DateTime),
+        name="proposed",
+    ).data([
+        (
+            index,
+            *ids,
+            datetime.combine(lesson.date, lesson.start_time),
+            datetime.combine(lesson.date, lesson.end_time),
+        )
+        for index, lesson, ids in lessons
+    ])
+    return select(proposed).cte("proposed")
+
+
+# Runs the branches as one UNION ALL, kinds of a lesson come back in the order of the branches
+async def _fetch_conflicts(session: AsyncSession, branches: list, kinds: list[str]) -> dict[int, list[str]]:
+    result = await session.execute(union_all(*branches))
+    conflicts = defaultdict(set)
+    for index, kind in result.all():
+        conflicts[index].add(kind)
+    return {index: sorted(found, key=kinds.index) for index, found in conflicts.items()}
+
+
+# Conflicts of proposed practice lessons with stored ones, for the whole batch in one query.
+# Returns index -> kinds: "instructor", "vehicle", "student" (practice lessons),
+# "instructor_group" (theory lessons of the instructor's groups).
+# Lessons must have start_time < end_time
+async def get_practice_batch_conflicts(session: AsyncSession, lessons: list[tuple[int, object]]):
+    if not lessons:
+        return {}
+
+    proposed = _proposed_lessons(
+        [(index, lesson, (lesson.instructor_id, lesson.vehicle_id, lesson.student_id)) for index, lesson in lessons],
+        ["instructor_id", "vehicle_id", "student_id"],
+    )
+    lesson_range = func.tsrange(proposed.c.starts_at, proposed.c.ends_at)
+
+    branches = [
+        select(proposed.c.idx, literal(kind).label("kind"))
+        .select_from(proposed)
+        .join(
+            PracticeSchedule,
+            (getattr(PracticeSchedule, f"{kind}_id") == proposed.c[f"{kind}_id"])
+            & PracticeSchedule.time_range.overlaps(lesson_range)
+        )
+        for kind in ("instructor", "vehicle", "student")
+    ]
+    branches.append(
+        select(proposed.c.idx, literal("instructor_group").label("kind"))
+        .select_from(proposed)
+        .join(Group, Group.instructor_id == proposed.c.instructor_id)
+        .join(
+            GroupSchedule,
+            (GroupSchedule.group_id == Group.id) & GroupSchedule.time_range.overlaps(lesson_range)
+        )
+    )
+    return await _fetch_conflicts(session, branches, ["instructor", "vehicle", "student", "instructor_group"])
+
+
+# Same for proposed group lessons, instructor_ids: group id -> instructor id (or None).
+# Kinds: "cabinet", "group", "instructor_practice", "instructor_group" (lessons of the instructor's other groups)
+async def get_group_batch_conflicts(
+    session: AsyncSession,
+    lessons: list[tuple[int, object]],
+    instructor_ids: dict[int, int | None],
+):
+    if not lessons:
+        return {}
+
+    proposed = _proposed_lessons(
+        [
+            (index, lesson, (lesson.group_id, lesson.cabinet_id, instructor_ids.get(lesson.group_id)))
+            for index, lesson in lessons
+        ],
+        ["group_id", "cabinet_id", "instructor_id"],
+    )
+    lesson_range = func.tsrange(proposed.c.starts_at, proposed.c.ends_at)
+
+    branches = [
+        select(proposed.c.idx, literal(kind).label("kind"))
+        .select_from(proposed)
+        .join(
+            GroupSchedule,
+            (getattr(GroupSchedule, f"{kind}_id") == proposed.c[f"{kind}_id"])
+            & GroupSchedule.time_range.overlaps(lesson_range)
+        )
+        for kind in ("cabinet", "group")
+    ]
+    branches.append(
+        select(proposed.c.idx, literal("instructor_practice").label("kind"))
+        .select_from(proposed)
+        .join(
+            PracticeSchedule,
+            (PracticeSchedule.instructor_id == proposed.c.instructor_id)
+            & PracticeSchedule.time_range.overlaps(lesson_range)
+        )
+    )
+    branches.append(
+        select(proposed.c.idx, literal("instructor_group").label("kind"))
+        .select_from(proposed)
+        .join(Group, (Group.instructor_id == proposed.c.instructor_id) & (Group.id != proposed.c.group_id))
+        .join(
+            GroupSchedule,
+            (GroupSchedule.group_id == Group.id) & GroupSchedule.time_range.overlaps(lesson_range)
+        )
+    )
+    return await _fetch_conflicts(
+        session, branches, ["cabinet", "group", "instructor_practice", "instructor_group"]
+    )
+
+
+# Overlaps between the proposed lessons themselves.
+# lessons: (index, resource kind, resource id, date, start_time, end_time), resource id None is skipped.
+# Returns index -> [(kind, index of the other lesson)]
+def find_batch_overlaps(lessons: list[tuple]) -> dict[int, list[tuple[str, int]]]:
+    lessons = sorted(
+        (lesson for lesson in lessons if lesson[2] is not None),
+        key=lambda lesson: lesson[1:5],
+    )
+    overlaps = defaultdict(list)
+    for (kind, _, _), resource_lessons in groupby(lessons, key=lambda lesson: lesson[1:4]):
+        active = []
+        for index, _, _, _, start_time, end_time in resource_lessons:
+            active = [(other, other_end) for other, other_end in active if other_end > start_time]
+            for other, _ in active:
+                overlaps[index].append((kind, other))
+                overlaps[other].append((kind, index))
+            active.append((index, end_time))
+    return overlaps
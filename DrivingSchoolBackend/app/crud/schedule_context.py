@@ -0,0 +1,85 @@
+from datetime import date
+from typing import Iterable, List
+
+from sqlalchemy import select, and_, or_, false
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.models import GroupSchedule, Group, PracticeSchedule
+from core.schemas.group_schedule import ExistingGroupScheduleSchema
+from core.schemas.practice_schedule import ExistingPracticeScheduleSchema
+
+
+# Existing lessons for batch generation are loaded with one query per table: every filter
+# (instructor, vehicles / cabinets, student / group) is a branch of one OR, so a lesson matching
+# several of them comes back once. Rows are read as plain columns and turned into generator inputs
+
+def _in(column, ids: Iterable[int]):
+    ids = list(dict.fromkeys(ids))
+    return column.in_(ids) if ids else false()
+
+
+async def load_existing_group_schedules(
+    session: AsyncSession,
+    start_date: date,
+    end_date: date,
+    group_ids: Iterable[int] = (),
+    instructor_ids: Iterable[int] = (),
+    cabinet_ids: Iterable[int] = (),
+) -> List[ExistingGroupScheduleSchema]:
+    result = await session.execute(
+        select(
+            GroupSchedule.id,
+            GroupSchedule.date,
+            GroupSchedule.start_time,
+            GroupSchedule.end_time,
+            GroupSchedule.group_id,
+            GroupSchedule.cabinet_id,
+            Group.instructor_id,
+        )
+        .join(GroupSchedule.group)
+        .where(
+            and_(
+                GroupSchedule.date >= start_date,
+                GroupSchedule.date <= end_date,
+                or_(
+                    _in(GroupSchedule.group_id, group_ids),
+                    _in(Group.instructor_id, instructor_ids),
+                    _in(GroupSchedule.cabinet_id, cabinet_ids),
+                )
+            )
+        )
+    )
+    return [ExistingGroupScheduleSchema.model_validate(row, from_attributes=True) for row in result.all()]
+
+
+async def load_existing_practice_schedules(
+    session: AsyncSession,
+    start_date: date,
+    end_date: date,
+    student_ids: Iterable[int] = (),
+    instructor_ids: Iterable[int] = (),
+    vehicle_ids: Iterable[int] = (),
+) -> List[ExistingPracticeScheduleSchema]:
+    result = await session.execute(
+        select(
+            PracticeSchedule.id,
+            PracticeSchedule.date,
+            PracticeSchedule.start_time,
+            PracticeSchedule.end_time,
+            PracticeSchedule.instructor_id,
+            PracticeSchedule.vehicle_id,
+            PracticeSchedule.student_id,
+        )
+        .where(
+            and_(
+                PracticeSchedule.date >= start_date,
+                PracticeSchedule.date <= end_date,
+                or_(
+                    _in(PracticeSchedule.student_id, student_ids),
+                    _in(PracticeSchedule.instructor_id, instructor_ids),
+                    _in(PracticeSchedule.vehicle_id, vehicle_ids),
+                )
+            )
+        )
+    )
+    return [ExistingPracticeScheduleSchema.model_validate(row, from_attributes=True) for row in result.all()]
@@ -0,0 +1,60 @@
+from typing import Dict, List, Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.models import Base
+
+
+# Inserts generated lessons in one transaction and commits once: the whole batch is saved or nothing is.
+# With a list of parameters SQLAlchemy sends multi-row INSERT ... VALUES (...), (...) RETURNING id
+# statements ("insertmanyvalues", up to 1000 rows each) instead of a statement per row.
+# Returns ids in the order of items
+async def bulk_insert_schedules(
+    session: AsyncSession,
+    model: Type[Base],
+    items: List[BaseModel],
+    conflict_messages: Dict[str, str] | None = None,
+) -> List[int]:
+    if not items:
+        return []
+
+    try:
+        result = await session.execute(
+            insert(model).returning(model.id, sort_by_parameter_order=True),
+            [item.model_dump() for item in items],
+        )
+        ids = list(result.scalars().all())
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        raise_schedule_conflict(e, conflict_messages or {})
+    except Exception:
+        await session.rollback()
+        raise
+
+    return ids
+
+
+def get_violated_constraint(error: IntegrityError) -> str | None:
+    # asyncpg keeps the constraint name on the driver exception wrapped by the DBAPI adapter
+    constraint_name = getattr(error.orig.__cause__, "constraint_name", None)
+    if constraint_name:
+        return constraint_name
+    message = str(error.orig)
+    if '"' in message:
+        return message.split('"')[1]
+    return None
+
+
+# Lesson overlaps are rejected by the exclusion constraints of the schedule tables,
+# maps the violated constraint to its "Schedule conflict detected" message.
+# Violations of other constraints are raised as they are
+def raise_schedule_conflict(error: IntegrityError, conflict_messages: Dict[str, str]):
+    detail = conflict_messages.get(get_violated_constraint(error))
+    if detail is None:
+        raise error
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail) from error
@@ -6,14 +6,16 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, text, asc, desc, or_, exists
 from sqlalchemy.orm import selectinload, joinedload
 
-from core.models import User, Student, PracticeSchedule
-from auth.utils import hash_password
+from core.models import db_helper, User, Student, PracticeSchedule
+from auth.utils import hash_password_async, hash_password_if_changed
 from core.schemas.profile import StudentProfileSchema
 from core.schemas.student import StudentCreateSchema, StudentUpdateSchema, StudentPaginatedReadSchema
 from core.schemas.user import UserSchema
+from core.config import settings
 from crud.category_level import get_category_level_by_id
 from crud.group import get_group_by_id
-from crud.user import get_user_by_username, get_user_by_phone_number
+from crud.role_provisioning import RoleProvisioner
+from crud.user import get_user_by_username, get_user_by_phone_number, invalidate_user_role
 
 
 async def create_student(session: AsyncSession, data: StudentCreateSchema):
@@ -58,7 +60,7 @@ async def create_student(session: AsyncSession, data: StudentCreateSchema):
         patronymic=data.user.patronymic,
         birthday=data.user.birthday,
         phone_number=data.user.phone_number,
-        hashed_password=hash_password(data.password),
+        hashed_password=await hash_password_async(data.password),
     )
     session.add(user)
     await session.flush()
@@ -70,16 +72,12 @@ async def create_student(session: AsyncSession, data: StudentCreateSchema):
     )
     session.add(student)
 
-    create_query = text(f"""
-        CREATE USER "{data.user.username}" WITH PASSWORD '{data.password}';
-    """)
-    grant_query = text(f"""
-        GRANT student_role TO "{data.user.username}";
-    """)
-    await session.execute(create_query)
-    await session.execute(grant_query)
+    provisioner = RoleProvisioner()
+    provisioner.add(data.user.username, data.password, settings.roles.student)
+    await provisioner.flush(session)
 
     await session.commit()
+    invalidate_user_role(data.user.username)
 
     await session.refresh(student)
 
@@ -144,19 +142,25 @@ async def update_student(session: AsyncSession, student_id: int, data: StudentUp
     user.birthday = data.user.birthday
     user.phone_number = data.user.phone_number
 
+    password_changed = False
     if data.password:
-        new_hashed_password = hash_password(data.password)
+        new_hashed_password = await hash_password_if_changed(data.password, user.hashed_password)
 
-        if user.hashed_password != new_hashed_password:
+        if new_hashed_password:
             user.hashed_password = new_hashed_password
 
             query = text(f"""
                 ALTER USER "{user.username}" WITH PASSWORD '{data.password}';
             """)
             await session.execute(query)
+            password_changed = True
 
     await session.commit()
+    # Refreshed before the engines are dropped: a user changing their own password works through
+    # one of them, and a new connection would be opened with the old password from the token
     await session.refresh(student)
+    if password_changed:
+        await db_helper.user_engines.discard_user(user.username)
     return student
 
 
@@ -179,6 +183,17 @@ async def get_student_by_id(session: AsyncSession, student_id: int):
     return student
 
 
+async def get_students_by_group_id(session: AsyncSession, group_id: int):
+    exists = await get_group_by_id(session, group_id)
+
+    result = await session.execute(
+        select(Student)
+        .where(Student.group_id == group_id)
+        .order_by(Student.id)
+    )
+    return result.scalars().all()
+
+
 async def get_student_profile(session: AsyncSession, student_id: int):
     result = await session.execute(
         select(Student)
@@ -1,3 +1,5 @@
+import time
+
 from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -40,10 +42,33 @@ async def get_all_users(session: AsyncSession):
     return result.scalars().all()
 
 
+# username -> (role, expires_at), per process (see settings.roles.cache_ttl)
+_user_role_cache: dict[str, tuple[str, float]] = {}
+
+
+def invalidate_user_role(username: str):
+    _user_role_cache.pop(username, None)
+
+
+def _cache_user_role(username: str, role: str):
+    if len(_user_role_cache) >= settings.roles.cache_size:
+        now = time.monotonic()
+        for key in [k for k, (_, expires_at) in _user_role_cache.items() if expires_at <= now]:
+            del _user_role_cache[key]
+        if len(_user_role_cache) >= settings.roles.cache_size:
+            del _user_role_cache[next(iter(_user_role_cache))]
+
+    _user_role_cache[username] = (role, time.monotonic() + settings.roles.cache_ttl)
+
+
 async def get_user_role_by_username(
     session: AsyncSession,
     username: str
 ):
+    cached = _user_role_cache.get(username)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+
     query = text("""
         SELECT r.rolname
         FROM pg_roles u
@@ -55,6 +80,10 @@ async def get_user_role_by_username(
     roles = result.scalars().all()
 
     if settings.roles.admin in roles:
-        return settings.roles.admin
+        role = settings.roles.admin
+    else:
+        role = roles[0] if roles[0] else None
 
-    return roles[0] if roles[0] else None
+    if role:
+        _cache_user_role(username, role)
+    return role
@@ -0,0 +1,8 @@
+__all__ = (
+    "JOB_HANDLERS",
+    "JobCancelledError",
+    "job_workers",
+)
+
+from .handlers import JOB_HANDLERS
+from .worker import JobCancelledError, job_workers
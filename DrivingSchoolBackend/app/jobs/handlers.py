@@ -0,0 +1,73 @@
+import json
+from typing import Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud.job import ProgressCallback
+from jobs.uploads import read_upload
+from schedule_generators.runner import CancelCheck
+
+# handler(session, payload, progress, cancel_check) -> JSON-serializable result
+JobHandler = Callable[[AsyncSession, dict, ProgressCallback, CancelCheck], Awaitable[dict]]
+
+
+# The seed file holds passwords, the payload only names the uploaded file (see jobs.uploads)
+async def load_data(session: AsyncSession, payload: dict, progress: ProgressCallback, cancel_check: CancelCheck):
+    from crud.data_management import load_initial_data
+    data = json.loads(read_upload(payload["upload"]))
+    return await load_initial_data(data, session, progress=progress)
+
+
+async def generate_data(session: AsyncSession, payload: dict, progress: ProgressCallback, cancel_check: CancelCheck):
+    from crud.data_management import generate_test_data
+    return await generate_test_data(session, progress=progress)
+
+
+async def create_group_schedules(
+    session: AsyncSession, payload: dict, progress: ProgressCallback, cancel_check: CancelCheck
+):
+    from core.schemas.group_schedule import GroupScheduleButchCreateSchema
+    from crud.group_schedule import create_butch_group_schedules
+    return await create_butch_group_schedules(
+        session, GroupScheduleButchCreateSchema(**payload), cancel_check=cancel_check
+    )
+
+
+async def create_school_group_schedules(
+    session: AsyncSession, payload: dict, progress: ProgressCallback, cancel_check: CancelCheck
+):
+    from core.schemas.group_schedule import GroupScheduleSchoolButchCreateSchema
+    from crud.group_schedule import create_butch_school_group_schedules
+    return await create_butch_school_group_schedules(
+        session, GroupScheduleSchoolButchCreateSchema(**payload), cancel_check=cancel_check
+    )
+
+
+async def create_practice_schedules(
+    session: AsyncSession, payload: dict, progress: ProgressCallback, cancel_check: CancelCheck
+):
+    from core.schemas.practice_schedule import PracticeScheduleButchCreateSchema
+    from crud.practice_schedule import create_butch_practice_schedules
+    return await create_butch_practice_schedules(
+        session, PracticeScheduleButchCreateSchema(**payload), cancel_check=cancel_check
+    )
+
+
+async def create_group_practice_schedules(
+    session: AsyncSession, payload: dict, progress: ProgressCallback, cancel_check: CancelCheck
+):
+    from core.schemas.practice_schedule import PracticeScheduleGroupButchCreateSchema
+    from crud.practice_schedule import create_butch_group_practice_schedules
+    return await create_butch_group_practice_schedules(
+        session, PracticeScheduleGroupButchCreateSchema(**payload), cancel_check=cancel_check
+    )
+
+
+JOB_HANDLERS: dict[str, JobHandler] = {
+    "load_data": load_data,
+    "generate_data": generate_data,
+    "group_schedules.create_butch": create_group_schedules,
+    "group_schedules.create_butch_school": create_school_group_schedules,
+    "practice_schedules.create_butch": create_practice_schedules,
+    "practice_schedules.create_butch_group": create_group_practice_schedules,
+}
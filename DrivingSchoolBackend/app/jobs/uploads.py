@@ -0,0 +1,40 @@
+import os
+import tempfile
+from contextlib import suppress
+from pathlib import Path
+
+from core.config import settings
+
+
+def _upload_dir() -> Path:
+    upload_dir = settings.jobs.upload_dir or Path(tempfile.gettempdir()) / "driving_school_jobs"
+    upload_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+    return upload_dir
+
+
+def _upload_path(name: str) -> Path:
+    # Names come from the job payload, never follow a path out of the upload directory
+    if not name or Path(name).name != name:
+        raise ValueError("Invalid upload name")
+    return _upload_dir() / name
+
+
+# Saves uploaded content readable by the app user only, returns the name stored in the job payload
+def save_upload(content: bytes) -> str:
+    fd, path = tempfile.mkstemp(dir=_upload_dir(), prefix="job_", suffix=".upload")
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    return Path(path).name
+
+
+def read_upload(name: str) -> bytes:
+    try:
+        return _upload_path(name).read_bytes()
+    except FileNotFoundError:
+        raise Exception("Uploaded file of the job is no longer available")
+
+
+def remove_upload(name: str | None):
+    if name:
+        with suppress(FileNotFoundError, ValueError):
+            _upload_path(name).unlink()
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import socket
+from contextlib import suppress
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from core.config import settings
+from core.models import db_helper, Job
+from crud.job import claim_job, touch_job, finish_job, finish_abandoned_jobs
+from jobs.handlers import JOB_HANDLERS
+from jobs.uploads import remove_upload
+
+
+class JobCancelledError(Exception):
+    pass
+
+
+# Jobs run with the rights of the user who enqueued them: the main engine switches to the user's role
+# (job.username) with SET LOCAL ROLE in every transaction, so the same GRANTs apply as for the
+# synchronous endpoints. In "login" session mode the main DB user must be a member of the role,
+# the API refuses background jobs otherwise
+async def job_session_getter(username: str):
+    async for session in db_helper.role_session_getter(username):
+        yield session
+
+
+class JobWorkerPool:
+    """In-process workers claiming jobs from the job table.
+
+    Every app process runs its own pool, claims go through FOR UPDATE SKIP LOCKED,
+    so pools of several processes or hosts share one queue. A job stopped with its process
+    keeps "running" until its heartbeat gets stale, then it is claimed again.
+    """
+
+    def __init__(self, workers: int, poll_interval: float, heartbeat_interval: float):
+        self.workers: int = workers
+        self.poll_interval: float = poll_interval
+        self.heartbeat_interval: float = heartbeat_interval
+        self.worker_id_prefix: str = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker_loop(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._janitor_loop()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+
+    async def _worker_loop(self, index: int):
+        worker_id = f"{self.worker_id_prefix}:{index}"
+        while True:
+            try:
+                job = None
+                async for session in db_helper.session_getter():
+                    job = await claim_job(session, worker_id)
+
+                if job is None:
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+
+                await self._run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Database is unavailable, try again later
+                await asyncio.sleep(self.poll_interval)
+
+    async def _janitor_loop(self):
+        while True:
+            await asyncio.sleep(settings.jobs.stale_timeout)
+            with suppress(Exception):
+                async for session in db_helper.session_getter():
+                    for payload in await finish_abandoned_jobs(session):
+                        remove_upload((payload or {}).get("upload"))
+
+    async def _touch(self, job_id: int, progress: float | None = None, message: str | None = None) -> bool:
+        async for session in db_helper.session_getter():
+            return await touch_job(session, job_id, progress, message)
+
+    async def _run_job(self, job: Job):
+        handler = JOB_HANDLERS.get(job.kind)
+        if handler is None:
+            async for session in db_helper.session_getter():
+                await finish_job(session, job.id, "failed", error=f"Unknown job kind: {job.kind}")
+            remove_upload((job.payload or {}).get("upload"))
+            return
+
+        cancelled = asyncio.Event()
+
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(self.heartbeat_interval)
+                with suppress(Exception):
+                    if await self._touch(job.id):
+                        cancelled.set()
+
+        # Progress points are also cancellation points
+        async def progress(fraction: float, message: str):
+            if await self._touch(job.id, round(fraction, 4), message[:255]):
+                cancelled.set()
+            if cancelled.is_set():
+                raise JobCancelledError("Job cancelled")
+
+        async def cancel_check() -> bool:
+            return cancelled.is_set()
+
+        heartbeat_task = asyncio.create_task(heartbeat())
+        try:
+            async for session in job_session_getter(job.username):
+                result = await handler(session, job.payload or {}, progress, cancel_check)
+            job_status, result, error = "succeeded", jsonable_encoder(result), None
+        except HTTPException as e:
+            job_status, result, error = "failed", None, f"{e.detail}"
+        except Exception as e:
+            job_status, result, error = ("cancelled" if cancelled.is_set() else "failed"), None, f"{e}"
+        finally:
+            heartbeat_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await heartbeat_task
+
+        async for session in db_helper.session_getter():
+            await finish_job(session, job.id, job_status, result=result, error=error)
+        remove_upload((job.payload or {}).get("upload"))
+
+
+job_workers = JobWorkerPool(
+    workers=settings.jobs.workers,
+    poll_interval=settings.jobs.poll_interval,
+    heartbeat_interval=settings.jobs.heartbeat_interval,
+)
@@ -1,20 +1,47 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
 
 from api import router as api_router
+from auth.utils import password_hashing_executor
 from core.config import settings
 from core.models import db_helper
+from jobs import job_workers
+from schedule_generators.runner import shutdown_solver_executor
+from warmup import run_warmup, warmup_state
+
+
+async def evict_idle_user_engines():
+    while True:
+        await asyncio.sleep(settings.db.user_engine_idle_timeout)
+        await db_helper.user_engines.evict_idle()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # startup
+    eviction_task = asyncio.create_task(evict_idle_user_engines())
+    if settings.warmup.enabled:
+        warmup_task = asyncio.create_task(run_warmup())
+    else:
+        warmup_task = None
+        warmup_state["done"] = True
+    if settings.jobs.workers:
+        job_workers.start()
     yield
     # shutdown
+    await job_workers.stop()
+    for task in (eviction_task, warmup_task):
+        if task:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
     await db_helper.dispose()
+    password_hashing_executor.shutdown(wait=False, cancel_futures=True)
+    shutdown_solver_executor()
 
 
 main_app = FastAPI(
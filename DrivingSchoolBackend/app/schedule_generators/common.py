@@ -0,0 +1,187 @@
+import math
+import time as timer
+from datetime import date, timedelta, time, datetime
+from collections import defaultdict
+from typing import Dict, List
+
+from core.schemas.schedule_generation import ScheduleSolveStatisticsSchema
+from schedule_generators.engines import get_engine, Availability, Assignment, StudentSlots, JointAssignment
+
+
+class ScheduleGenerationError(Exception):
+    def __init__(self, message: str, statistics: ScheduleSolveStatisticsSchema):
+        super().__init__(message, statistics)
+        self.message = message
+        self.statistics = statistics
+
+    def __str__(self):
+        return self.message
+
+
+def generate_days(start_date: date, end_date: date, include_weekends: bool) -> List[date]:
+    days = []
+    current_day = start_date
+    while current_day <= end_date:
+        if include_weekends or current_day.weekday() < 5:
+            days.append(current_day)
+        current_day += timedelta(days=1)
+    return days
+
+
+def generate_time_slots(
+    schedule_start_time: time,
+    schedule_end_time: time,
+    duration_delta: timedelta,
+) -> List[tuple[time, time]]:
+    time_slots = []
+    current_slot_start = datetime.combine(date.today(), schedule_start_time)
+    end_limit = datetime.combine(date.today(), schedule_end_time)
+
+    while current_slot_start + duration_delta <= end_limit:
+        slot_start = current_slot_start.time()
+        slot_end = (current_slot_start + duration_delta).time()
+        time_slots.append((slot_start, slot_end))
+        current_slot_start += duration_delta
+    return time_slots
+
+
+# Lower bound of days to add after end_date to fit the missing lessons,
+# assuming the added days are completely free
+def estimate_extension_days(
+    end_date: date,
+    missing_count: int,
+    schedules_per_day: int,
+    slots_per_day: int,
+    include_weekends: bool,
+) -> int | None:
+    per_day = min(schedules_per_day, slots_per_day)
+    if per_day <= 0:
+        return None
+
+    days_needed = math.ceil(missing_count / per_day)
+    extension = 0
+    current_day = end_date
+    while days_needed > 0:
+        current_day += timedelta(days=1)
+        extension += 1
+        if include_weekends or current_day.weekday() < 5:
+            days_needed -= 1
+    return extension
+
+
+# How the lessons that did not fit could be planned, for partial results
+def get_extension_hint(statistics: ScheduleSolveStatisticsSchema) -> str:
+    if statistics.suggested_end_date is not None:
+        return f"end date should be at least {statistics.suggested_end_date} to fit the rest"
+    return "no later end date would fit the rest, try more schedules per day"
+
+
+def solve_availability(
+    availability: Availability,
+    schedule_count: int,
+    schedules_per_day: int,
+    end_date: date,
+    slots_per_day: int,
+    include_weekends: bool,
+    engine: str | None = None,
+    allow_partial: bool = False,
+) -> tuple[List[Assignment], ScheduleSolveStatisticsSchema]:
+    schedule_engine = get_engine(engine)
+
+    started = timer.perf_counter()
+    assignments, status = schedule_engine.solve(availability, schedule_count, schedules_per_day)
+    solve_seconds = timer.perf_counter() - started
+
+    count = len(assignments)
+    statistics = ScheduleSolveStatisticsSchema(
+        engine=schedule_engine.name,
+        status=status,
+        requested_count=schedule_count,
+        generated_count=count,
+        candidate_slots_count=len(availability),
+        solve_seconds=round(solve_seconds, 4),
+    )
+
+    if count < schedule_count:
+        extension = estimate_extension_days(
+            end_date, schedule_count - count, schedules_per_day, slots_per_day, include_weekends
+        )
+        statistics.min_extension_days = extension
+        statistics.suggested_end_date = end_date + timedelta(days=extension) if extension else None
+
+        if not allow_partial:
+            hint = (f'end date should be at least {statistics.suggested_end_date}'
+                    if statistics.suggested_end_date else 'try more schedules per day')
+            raise ScheduleGenerationError(
+                f'Not all schedules can be generated (only {count}/{schedule_count}), {hint}',
+                statistics,
+            )
+
+    return assignments, statistics
+
+
+def solve_joint_availability(
+    resources: Availability,
+    student_slots: StudentSlots,
+    instructors: Dict[int, int],
+    demands: Dict[int, int],
+    schedules_per_day: int,
+    end_date: date,
+    slots_per_day: int,
+    include_weekends: bool,
+    engine: str | None = None,
+    allow_partial: bool = False,
+) -> tuple[List[JointAssignment], ScheduleSolveStatisticsSchema]:
+    schedule_engine = get_engine(engine)
+
+    started = timer.perf_counter()
+    assignments, status = schedule_engine.solve_joint(
+        resources, student_slots, instructors, demands, schedules_per_day
+    )
+    solve_seconds = timer.perf_counter() - started
+
+    generated = defaultdict(int)
+    for student_id, _, _, _ in assignments:
+        generated[student_id] += 1
+    missing = {student_id: count - generated[student_id] for student_id, count in demands.items()}
+
+    count = len(assignments)
+    schedule_count = sum(demands.values())
+    statistics = ScheduleSolveStatisticsSchema(
+        engine=schedule_engine.name,
+        status=status,
+        requested_count=schedule_count,
+        generated_count=count,
+        candidate_slots_count=sum(len(slots) for slots in student_slots.values()),
+        solve_seconds=round(solve_seconds, 4),
+        incomplete_ids=sorted(student_id for student_id, m in missing.items() if m > 0),
+    )
+
+    if count < schedule_count:
+        # Lower bound over every shared capacity: a student, an instructor and all vehicles
+        missing_by_instructor = defaultdict(int)
+        for student_id, m in missing.items():
+            missing_by_instructor[instructors[student_id]] += m
+        vehicles_per_day = slots_per_day * max((len(v) for v in resources.values()), default=0)
+
+        extensions = [
+            estimate_extension_days(end_date, max(missing.values()), schedules_per_day, slots_per_day,
+                                    include_weekends),
+            estimate_extension_days(end_date, max(missing_by_instructor.values()), slots_per_day, slots_per_day,
+                                    include_weekends),
+            estimate_extension_days(end_date, schedule_count - count, vehicles_per_day, vehicles_per_day,
+                                    include_weekends),
+        ]
+        extension = None if None in extensions else max(extensions)
+        statistics.min_extension_days = extension
+        statistics.suggested_end_date = end_date + timedelta(days=extension) if extension else None
+
+        if not allow_partial:
+            hint = (f'end date should be at least {statistics.suggested_end_date}'
+                    if statistics.suggested_end_date else 'try more schedules per day')
+            raise ScheduleGenerationError(
+                f'Not all schedules can be generated (only {count}/{schedule_count}), {hint}',
+                statistics,
+            )
+
+    return assignments, statistics
@@ -0,0 +1,414 @@
+import time as timer
+from collections import defaultdict, deque
+from datetime import date, time
+from typing import Dict, List, Tuple
+
+from core.config import settings
+
+# (day, slot start) -> ids of free resources (vehicles or cabinets) for this slot
+Availability = Dict[Tuple[date, time], List[int]]
+# (day, slot start, resource id)
+Assignment = Tuple[date, time, int]
+# student (or group) id -> (day, slot start) keys where the student and their instructor are free
+StudentSlots = Dict[int, List[Tuple[date, time]]]
+# (student id, day, slot start, resource id)
+JointAssignment = Tuple[int, date, time, int]
+
+# timer.monotonic() deadline shared by all solves of one generator run in this process,
+# set by the runner so that several solves of a generator fit into one time limit
+_solve_deadline: float | None = None
+
+
+def set_solve_deadline(deadline: float | None):
+    global _solve_deadline
+    _solve_deadline = deadline
+
+
+def get_cbc_time_limit() -> int:
+    time_limit = settings.scheduling.time_limit
+    if _solve_deadline is not None:
+        time_limit = min(time_limit, max(1, int(_solve_deadline - timer.monotonic())))
+    return time_limit
+
+
+class ScheduleEngine:
+    """Chooses lessons among free slots.
+
+    Maximizes the number of lessons with at most `schedules_per_day` lessons a day,
+    at most `schedule_count` lessons in total and one resource per slot.
+    Returns the chosen lessons and the solve status: "optimal", "feasible"
+    (best plan found within the time limit / gap) or "no_solution".
+    """
+
+    name: str = ""
+
+    def solve(
+        self,
+        availability: Availability,
+        schedule_count: int,
+        schedules_per_day: int,
+    ) -> Tuple[List[Assignment], str]:
+        raise NotImplementedError
+
+    # Several students (or groups) in one model: resources (vehicles or cabinets) and instructors are shared,
+    # an instructor teaches one lesson per slot, every student gets at most demands[student] lessons
+    def solve_joint(
+        self,
+        resources: Availability,
+        student_slots: StudentSlots,
+        instructors: Dict[int, int],
+        demands: Dict[int, int],
+        schedules_per_day: int,
+    ) -> Tuple[List[JointAssignment], str]:
+        raise NotImplementedError
+
+
+class FlowNetwork:
+    """Integer max flow (Dinic's algorithm).
+
+    Edges are stored in pairs, edge ^ 1 is the residual edge of edge.
+    """
+
+    def __init__(self):
+        self.heads: List[int] = []
+        self.capacities: List[int] = []
+        self.adjacency: List[List[int]] = []
+
+    def add_node(self) -> int:
+        self.adjacency.append([])
+        return len(self.adjacency) - 1
+
+    def add_edge(self, tail: int, head: int, capacity: int) -> int:
+        edge = len(self.heads)
+        self.adjacency[tail].append(edge)
+        self.heads.append(head)
+        self.capacities.append(capacity)
+        self.adjacency[head].append(edge + 1)
+        self.heads.append(tail)
+        self.capacities.append(0)
+        return edge
+
+    def get_flow(self, edge: int) -> int:
+        return self.capacities[edge ^ 1]
+
+    def _build_levels(self, source: int, sink: int) -> List[int] | None:
+        levels = [-1] * len(self.adjacency)
+        levels[source] = 0
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            for edge in self.adjacency[node]:
+                head = self.heads[edge]
+                if self.capacities[edge] > 0 and levels[head] < 0:
+                    levels[head] = levels[node] + 1
+                    queue.append(head)
+        return levels if levels[sink] >= 0 else None
+
+    # One augmenting path along the levels, iterative so that long paths do not hit the recursion limit
+    def _augment(self, source: int, sink: int, levels: List[int], pointers: List[int]) -> int:
+        path = []
+        node = source
+        while node != sink:
+            adjacency = self.adjacency[node]
+            while pointers[node] < len(adjacency):
+                edge = adjacency[pointers[node]]
+                if self.capacities[edge] > 0 and levels[self.heads[edge]] == levels[node] + 1:
+                    break
+                pointers[node] += 1
+            else:
+                # Dead end, step back and skip the edge that led here
+                if not path:
+                    return 0
+                node = self.heads[path.pop() ^ 1]
+                pointers[node] += 1
+                continue
+
+            path.append(adjacency[pointers[node]])
+            node = self.heads[path[-1]]
+
+        pushed = min(self.capacities[edge] for edge in path)
+        for edge in path:
+            self.capacities[edge] -= pushed
+            self.capacities[edge ^ 1] += pushed
+        return pushed
+
+    def max_flow(self, source: int, sink: int) -> int:
+        total = 0
+        while (levels := self._build_levels(source, sink)) is not None:
+            pointers = [0] * len(self.adjacency)
+            while pushed := self._augment(source, sink, levels, pointers):
+                total += pushed
+        return total
+
+
+# Exact joint plan: student demands and per day caps nest on one side, slot capacities and
+# one lesson per instructor and slot nest on the other, so the model is a flow network
+# source -> student -> (student, day) -> (instructor, slot) -> slot -> sink and its integer
+# max flow is a plan with the most lessons
+def solve_joint_max_flow(
+    resources: Availability,
+    student_slots: StudentSlots,
+    instructors: Dict[int, int],
+    demands: Dict[int, int],
+    schedules_per_day: int,
+) -> List[JointAssignment]:
+    network = FlowNetwork()
+    source = network.add_node()
+    sink = network.add_node()
+    slot_nodes = {}
+    instructor_slot_nodes = {}
+    lesson_edges = {}
+
+    for student_id in sorted(student_slots):
+        student_node = network.add_node()
+        network.add_edge(source, student_node, demands[student_id])
+        day_nodes = {}
+
+        for d, start in sorted(set(student_slots[student_id])):
+            if not resources.get((d, start)):
+                continue
+            if d not in day_nodes:
+                day_nodes[d] = network.add_node()
+                network.add_edge(student_node, day_nodes[d], schedules_per_day)
+
+            instructor_slot = (instructors[student_id], d, start)
+            if instructor_slot not in instructor_slot_nodes:
+                if (d, start) not in slot_nodes:
+                    slot_nodes[(d, start)] = network.add_node()
+                    network.add_edge(slot_nodes[(d, start)], sink, len(resources[(d, start)]))
+                instructor_slot_nodes[instructor_slot] = network.add_node()
+                network.add_edge(instructor_slot_nodes[instructor_slot], slot_nodes[(d, start)], 1)
+
+            lesson_edges[(student_id, d, start)] = network.add_edge(
+                day_nodes[d], instructor_slot_nodes[instructor_slot], 1
+            )
+
+    network.max_flow(source, sink)
+
+    result = []
+    used_resources = defaultdict(int)
+    for (student_id, d, start), edge in sorted(lesson_edges.items(), key=lambda item: item[0][1:] + item[0][:1]):
+        if not network.get_flow(edge):
+            continue
+        result.append((student_id, d, start, resources[(d, start)][used_resources[(d, start)]]))
+        used_resources[(d, start)] += 1
+    return result
+
+
+class CombinatorialEngine(ScheduleEngine):
+    # Slots of a day do not overlap and every free slot is worth one lesson,
+    # so taking the earliest free slots of every day up to the caps is optimal
+    name = "combinatorial"
+
+    def solve(
+        self,
+        availability: Availability,
+        schedule_count: int,
+        schedules_per_day: int,
+    ) -> Tuple[List[Assignment], str]:
+        result = []
+        per_day = defaultdict(int)
+
+        for d, start in sorted(availability):
+            if len(result) >= schedule_count:
+                break
+            if per_day[d] >= schedules_per_day or not availability[(d, start)]:
+                continue
+
+            result.append((d, start, availability[(d, start)][0]))
+            per_day[d] += 1
+
+        return result, "optimal"
+
+    # Slots are filled in chronological order, every slot goes to the students
+    # with the most lessons left, one per instructor and free vehicle.
+    # When that leaves a demand unmet, the plan is solved again exactly as a max flow
+    def solve_joint(
+        self,
+        resources: Availability,
+        student_slots: StudentSlots,
+        instructors: Dict[int, int],
+        demands: Dict[int, int],
+        schedules_per_day: int,
+    ) -> Tuple[List[JointAssignment], str]:
+        result = []
+        remaining = dict(demands)
+        per_day = defaultdict(int)
+
+        students_by_slot = defaultdict(list)
+        for student_id, slots in student_slots.items():
+            for key in slots:
+                if resources.get(key):
+                    students_by_slot[key].append(student_id)
+
+        for d, start in sorted(students_by_slot):
+            free_resources = list(resources[(d, start)])
+            busy_instructors = set()
+
+            for student_id in sorted(students_by_slot[(d, start)], key=lambda s: (-remaining[s], s)):
+                if not free_resources:
+                    break
+                if (
+                    remaining[student_id] <= 0
+                    or per_day[(student_id, d)] >= schedules_per_day
+                    or instructors[student_id] in busy_instructors
+                ):
+                    continue
+
+                result.append((student_id, d, start, free_resources.pop(0)))
+                remaining[student_id] -= 1
+                per_day[(student_id, d)] += 1
+                busy_instructors.add(instructors[student_id])
+
+        if any(v > 0 for v in remaining.values()):
+            result = solve_joint_max_flow(resources, student_slots, instructors, demands, schedules_per_day)
+        return result, "optimal"
+
+
+class PulpEngine(ScheduleEngine):
+    name = "pulp"
+
+    def solve(
+        self,
+        availability: Availability,
+        schedule_count: int,
+        schedules_per_day: int,
+    ) -> Tuple[List[Assignment], str]:
+        from pulp import LpProblem, LpVariable, LpBinary, lpSum, LpMaximize, PULP_CBC_CMD, \
+            LpSolutionOptimal, LpSolutionIntegerFeasible
+
+        # Resources of a slot are interchangeable and one lesson takes one slot:
+        # a variable per slot instead of per (slot, resource), the first free resource is assigned after the solve
+        slot_vars = {}
+        day_vars = defaultdict(list)
+        prob = LpProblem("ScheduleGeneration", LpMaximize)
+
+        for (d, start), resource_ids in availability.items():
+            if not resource_ids:
+                continue
+            var = LpVariable(f"x_{d}_{start}", cat=LpBinary)
+            slot_vars[(d, start)] = var
+            day_vars[d].append(var)
+
+        if not slot_vars:
+            return [], "optimal"
+
+        prob += lpSum(slot_vars.values())
+
+        # 1. Constraint schedules count per day
+        for variables in day_vars.values():
+            if len(variables) > schedules_per_day:
+                prob += lpSum(variables) <= schedules_per_day
+
+        # 2. Constraint total schedules count
+        prob += lpSum(slot_vars.values()) <= schedule_count
+
+        prob.solve(PULP_CBC_CMD(
+            msg=0,
+            timeLimit=get_cbc_time_limit(),
+            gapRel=settings.scheduling.gap_rel,
+        ))
+
+        if prob.sol_status == LpSolutionOptimal:
+            status = "optimal"
+        elif prob.sol_status == LpSolutionIntegerFeasible:
+            status = "feasible"
+        else:
+            return [], "no_solution"
+
+        return [
+            (d, start, availability[(d, start)][0])
+            for (d, start), var in sorted(slot_vars.items())
+            if round(var.value() or 0) == 1
+        ], status
+
+    def solve_joint(
+        self,
+        resources: Availability,
+        student_slots: StudentSlots,
+        instructors: Dict[int, int],
+        demands: Dict[int, int],
+        schedules_per_day: int,
+    ) -> Tuple[List[JointAssignment], str]:
+        from pulp import LpProblem, LpVariable, LpBinary, lpSum, LpMaximize, PULP_CBC_CMD, \
+            LpSolutionOptimal, LpSolutionIntegerFeasible
+
+        # Vehicles of a slot are interchangeable: a variable per (student, slot)
+        # and a capacity per slot, vehicles are assigned after the solve
+        lesson_vars = {}
+        student_vars = defaultdict(list)
+        student_day_vars = defaultdict(list)
+        slot_vars = defaultdict(list)
+        instructor_slot_vars = defaultdict(list)
+        prob = LpProblem("JointScheduleGeneration", LpMaximize)
+
+        for student_id, slots in student_slots.items():
+            for d, start in slots:
+                if not resources.get((d, start)):
+                    continue
+                var = LpVariable(f"x_{student_id}_{d}_{start}", cat=LpBinary)
+                lesson_vars[(student_id, d, start)] = var
+                student_vars[student_id].append(var)
+                student_day_vars[(student_id, d)].append(var)
+                slot_vars[(d, start)].append(var)
+                instructor_slot_vars[(instructors[student_id], d, start)].append(var)
+
+        if not lesson_vars:
+            return [], "optimal"
+
+        prob += lpSum(lesson_vars.values())
+
+        # 1. Constraint lessons count per student
+        for student_id, variables in student_vars.items():
+            prob += lpSum(variables) <= demands[student_id]
+
+        # 2. Constraint schedules count per student per day
+        for variables in student_day_vars.values():
+            prob += lpSum(variables) <= schedules_per_day
+
+        # 3. Constraint free vehicles per slot
+        for key, variables in slot_vars.items():
+            if len(variables) > len(resources[key]):
+                prob += lpSum(variables) <= len(resources[key])
+
+        # 4. Constraint one lesson per instructor per slot
+        for variables in instructor_slot_vars.values():
+            if len(variables) > 1:
+                prob += lpSum(variables) <= 1
+
+        prob.solve(PULP_CBC_CMD(
+            msg=0,
+            timeLimit=get_cbc_time_limit(),
+            gapRel=settings.scheduling.gap_rel,
+        ))
+
+        if prob.sol_status == LpSolutionOptimal:
+            status = "optimal"
+        elif prob.sol_status == LpSolutionIntegerFeasible:
+            status = "feasible"
+        else:
+            return [], "no_solution"
+
+        result = []
+        used_resources = defaultdict(int)
+        for (student_id, d, start), var in sorted(lesson_vars.items(), key=lambda item: item[0][1:] + item[0][:1]):
+            if round(var.value() or 0) != 1:
+                continue
+            result.append((student_id, d, start, resources[(d, start)][used_resources[(d, start)]]))
+            used_resources[(d, start)] += 1
+
+        return result, status
+
+
+ENGINES: Dict[str, ScheduleEngine] = {
+    CombinatorialEngine.name: CombinatorialEngine(),
+    PulpEngine.name: PulpEngine(),
+}
+
+
+def get_engine(name: str | None = None) -> ScheduleEngine:
+    name = name or settings.scheduling.engine
+    engine = ENGINES.get(name)
+    if engine is None:
+        raise Exception(f"Unknown schedule engine: {name}")
+    return engine
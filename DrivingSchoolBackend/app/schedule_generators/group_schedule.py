@@ -1,14 +1,83 @@
 from datetime import date, timedelta, time, datetime
-from pulp import LpProblem, LpVariable, LpBinary, lpSum, LpMaximize, PULP_CBC_CMD
-from typing import List
+import time as timer
 from collections import defaultdict
+from typing import Dict, List
 
+from schedule_generators.common import generate_days, generate_time_slots, solve_availability, \
+    solve_joint_availability, ScheduleGenerationError
 from core.schemas.group_schedule import GroupScheduleSchema, GroupForScheduleSchema, ExistingGroupScheduleSchema
 from core.schemas.practice_schedule import ExistingPracticeScheduleSchema
+from core.schemas.schedule_generation import SchoolTimetableStatisticsSchema
 
 
-def has_time_conflict(start1, end1, start2, end2):
-    return start1 < end2 and start2 < end1
+def to_minutes(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+
+# Lesson time as [start, end) minutes of the timeline, clipped to it (empty when outside)
+def timeline_interval(s, timeline_start: int, timeline_end: int) -> tuple[int, int]:
+    start = max(to_minutes(s.start_time), timeline_start) - timeline_start
+    end = min(to_minutes(s.end_time), timeline_end) - timeline_start
+    return start, end
+
+
+# Occupancy matrices (day x minute, and cabinet x day x minute) are built once from existing schedules,
+# then every slot is checked with prefix sums. Returns boolean array free[day, slot, cabinet]
+def build_occupancy_mask(
+    group: GroupForScheduleSchema,
+    cabinet_ids: List[int],
+    existing_group_schedules: List[ExistingGroupScheduleSchema],
+    existing_practice_schedules: List[ExistingPracticeScheduleSchema],
+    days: List[date],
+    time_slots: List[tuple[time, time]],
+):
+    import numpy as np
+
+    if not days or not time_slots or not cabinet_ids:
+        return np.zeros((len(days), len(time_slots), len(cabinet_ids)), dtype=bool)
+
+    timeline_start = to_minutes(time_slots[0][0])
+    timeline_end = max(to_minutes(end) for _, end in time_slots)
+    day_index = {d: i for i, d in enumerate(days)}
+    cabinet_index = {cab: i for i, cab in enumerate(cabinet_ids)}
+
+    # Group and instructor share one timeline: any of them busy blocks every cabinet
+    shared_busy = np.zeros((len(days), timeline_end - timeline_start), dtype=np.int32)
+    cabinet_busy = np.zeros((len(cabinet_ids), len(days), timeline_end - timeline_start), dtype=np.int32)
+
+    for s in existing_group_schedules:
+        i = day_index.get(s.date)
+        if i is None:
+            continue
+        start, end = timeline_interval(s, timeline_start, timeline_end)
+        if start >= end:
+            continue
+
+        if s.group_id == group.id or (s.instructor_id is not None and s.instructor_id == group.instructor_id):
+            shared_busy[i, start:end] = 1
+        c = cabinet_index.get(s.cabinet_id)
+        if c is not None:
+            cabinet_busy[c, i, start:end] = 1
+
+    for p in existing_practice_schedules:
+        i = day_index.get(p.date)
+        if i is None or p.instructor_id != group.instructor_id:
+            continue
+        start, end = timeline_interval(p, timeline_start, timeline_end)
+        if start < end:
+            shared_busy[i, start:end] = 1
+
+    slot_starts = np.array([to_minutes(start) - timeline_start for start, _ in time_slots])
+    slot_ends = np.array([to_minutes(end) - timeline_start for _, end in time_slots])
+
+    # Busy minutes inside [start, end) of every slot via prefix sums
+    shared_prefix = np.pad(shared_busy.cumsum(axis=-1), ((0, 0), (1, 0)))
+    cabinet_prefix = np.pad(cabinet_busy.cumsum(axis=-1), ((0, 0), (0, 0), (1, 0)))
+
+    shared_free = (shared_prefix[:, slot_ends] - shared_prefix[:, slot_starts]) == 0
+    cabinet_free = (cabinet_prefix[:, :, slot_ends] - cabinet_prefix[:, :, slot_starts]) == 0
+
+    return shared_free[:, :, None] & cabinet_free.transpose(1, 2, 0)
 
 
 def generate_group_schedule(
@@ -24,111 +93,283 @@ def generate_group_schedule(
     schedule_count=60,
     schedules_per_day=3,
     include_weekends: bool = False,
+    engine: str | None = None,
+    allow_partial: bool = False,
 ):
-    # Days generation
-    days = []
-    current_day = start_date
-    while current_day <= end_date:
-        if include_weekends or current_day.weekday() < 5:
-            days.append(current_day)
-        current_day += timedelta(days=1)
-
-    # Time slots generation
+    days = generate_days(start_date, end_date, include_weekends)
     duration_delta = timedelta(hours=schedule_duration.hour, minutes=schedule_duration.minute)
-    time_slots = []
-    current_slot_start = datetime.combine(date.today(), schedule_start_time)
-    end_limit = datetime.combine(date.today(), schedule_end_time)
+    time_slots = generate_time_slots(schedule_start_time, schedule_end_time, duration_delta)
+
+    free = build_occupancy_mask(
+        group=group,
+        cabinet_ids=cabinet_ids,
+        existing_group_schedules=existing_group_schedules,
+        existing_practice_schedules=existing_practice_schedules,
+        days=days,
+        time_slots=time_slots,
+    )
+
+    availability = {}
+    for day_index, slot_index in zip(*free.any(axis=2).nonzero()):
+        availability[(days[day_index], time_slots[slot_index][0])] = [
+            cabinet_ids[cabinet_index] for cabinet_index in free[day_index, slot_index].nonzero()[0]
+        ]
+
+    assignments, statistics = solve_availability(
+        availability=availability,
+        schedule_count=schedule_count,
+        schedules_per_day=schedules_per_day,
+        end_date=end_date,
+        slots_per_day=len(time_slots),
+        include_weekends=include_weekends,
+        engine=engine,
+        allow_partial=allow_partial,
+    )
+
+    result_list = []
+
+    for d, start, cab in assignments:
+        end = (datetime.combine(d, start) + duration_delta).time()
+        result_list.append(GroupScheduleSchema(
+            date=d, start_time=start, end_time=end, group_id=group.id, cabinet_id=cab
+        ))
+
+    return result_list, statistics
+
+
+# Same as build_occupancy_mask for several groups at once: returns free cabinet ids
+# for every (day, slot start) and, per group, the slots where the group and its instructor are free
+def build_joint_occupancy_mask(
+    groups: List[GroupForScheduleSchema],
+    cabinet_ids: List[int],
+    existing_group_schedules: List[ExistingGroupScheduleSchema],
+    existing_practice_schedules: List[ExistingPracticeScheduleSchema],
+    days: List[date],
+    time_slots: List[tuple[time, time]],
+):
+    import numpy as np
 
-    while current_slot_start + duration_delta <= end_limit:
-        slot_start = current_slot_start.time()
-        slot_end = (current_slot_start + duration_delta).time()
-        time_slots.append((slot_start, slot_end))
-        current_slot_start += duration_delta
+    if not days or not time_slots or not cabinet_ids:
+        return {}, {g.id: [] for g in groups}
 
-    # Grouping existing schedules
-    group_schedule_map = defaultdict(list)
-    instructor_schedule_map = defaultdict(list)
-    cabinet_schedule_map = defaultdict(list)
+    timeline_start = to_minutes(time_slots[0][0])
+    timeline_end = max(to_minutes(end) for _, end in time_slots)
+    day_index = {d: i for i, d in enumerate(days)}
+    cabinet_index = {cab: i for i, cab in enumerate(cabinet_ids)}
+    group_index = {g.id: i for i, g in enumerate(groups)}
+    instructor_groups = defaultdict(list)
+    for i, g in enumerate(groups):
+        instructor_groups[g.instructor_id].append(i)
+
+    # A group is busy with its own lessons and with any lesson of its instructor
+    group_busy = np.zeros((len(groups), len(days), timeline_end - timeline_start), dtype=np.int32)
+    cabinet_busy = np.zeros((len(cabinet_ids), len(days), timeline_end - timeline_start), dtype=np.int32)
 
     for s in existing_group_schedules:
-        group_schedule_map[s.group_id].append(s)
-        instructor_schedule_map[s.instructor_id].append(s)
-        cabinet_schedule_map[s.cabinet_id].append(s)
+        i = day_index.get(s.date)
+        if i is None:
+            continue
+        start, end = timeline_interval(s, timeline_start, timeline_end)
+        if start >= end:
+            continue
+
+        g = group_index.get(s.group_id)
+        if g is not None:
+            group_busy[g, i, start:end] = 1
+        if s.instructor_id is not None:
+            for g in instructor_groups.get(s.instructor_id, ()):
+                group_busy[g, i, start:end] = 1
+        c = cabinet_index.get(s.cabinet_id)
+        if c is not None:
+            cabinet_busy[c, i, start:end] = 1
 
-    practical_schedule_map = defaultdict(list)
     for p in existing_practice_schedules:
-        practical_schedule_map[p.instructor_id].append(p)
-
-    schedule_vars = {}
-    prob = LpProblem("GroupScheduleGeneration", LpMaximize)
-
-    for d in days:
-        for start, end in time_slots:
-            for cab in cabinet_ids:
-                key = (group.id, d, start, cab)
-                schedule_vars[key] = LpVariable(f"x_{group.id}_{d}_{start}_{cab}", cat=LpBinary)
-
-    prob += lpSum(schedule_vars.values())
-
-    # 1. Constraint schedules count per day
-    for d in days:
-        prob += lpSum(schedule_vars[(group.id, d, start, cab)] for start, _ in time_slots
-                      for cab in cabinet_ids) <= schedules_per_day
-
-    # 2. Constraint total schedules count for group
-    prob += lpSum(schedule_vars[(group.id, d, start, cab)] for d in days for start, _ in time_slots
-                  for cab in cabinet_ids) <= schedule_count
-
-    # 3. Conflicts with existing schedules
-    for d in days:
-        for start, end in time_slots:
-            for cab in cabinet_ids:
-                key = (group.id, d, start, cab)
-
-                # Group schedules conflict
-                for s in group_schedule_map[group.id]:
-                    if s.date == d and has_time_conflict(s.start_time, s.end_time, start, end):
-                        prob += schedule_vars[key] == 0
-
-                # Instructor schedules conflict
-                for s in instructor_schedule_map[group.instructor_id]:
-                    if s.date == d and has_time_conflict(s.start_time, s.end_time, start, end):
-                        prob += schedule_vars[key] == 0
-
-                # Cabinets schedules conflict
-                for s in cabinet_schedule_map[cab]:
-                    if s.date == d and has_time_conflict(s.start_time, s.end_time, start, end):
-                        prob += schedule_vars[key] == 0
-
-                # Instructor practice schedules conflict
-                for p in practical_schedule_map[group.instructor_id]:
-                    if p.date == d and has_time_conflict(p.start_time, p.end_time, start, end):
-                        prob += schedule_vars[key] == 0
-
-    # 4. Constraint group cannot be in multiple cabinets at the same time
-    for d in days:
-        for start, _ in time_slots:
-            prob += lpSum(
-                schedule_vars[(group.id, d, start, cab)]
-                for cab in cabinet_ids
-                if (group.id, d, start, cab) in schedule_vars
-            ) <= 1
-
-    prob.solve(PULP_CBC_CMD(msg=0))
-
-    count = int(float(str(lpSum([v.value() for v in schedule_vars.values()]))))
-
-    if count < schedule_count:
-        raise Exception(f'Not all schedules can be generated (only {count}/{schedule_count}), '
-                        f'try wider date range or more schedules per day')
+        i = day_index.get(p.date)
+        if i is None or p.instructor_id not in instructor_groups:
+            continue
+        start, end = timeline_interval(p, timeline_start, timeline_end)
+        if start < end:
+            for g in instructor_groups[p.instructor_id]:
+                group_busy[g, i, start:end] = 1
 
-    result_list = []
+    slot_starts = np.array([to_minutes(start) - timeline_start for start, _ in time_slots])
+    slot_ends = np.array([to_minutes(end) - timeline_start for _, end in time_slots])
+
+    group_prefix = np.pad(group_busy.cumsum(axis=-1), ((0, 0), (0, 0), (1, 0)))
+    cabinet_prefix = np.pad(cabinet_busy.cumsum(axis=-1), ((0, 0), (0, 0), (1, 0)))
+
+    # [group, day, slot] and [cabinet, day, slot]
+    group_free = (group_prefix[:, :, slot_ends] - group_prefix[:, :, slot_starts]) == 0
+    cabinet_free = (cabinet_prefix[:, :, slot_ends] - cabinet_prefix[:, :, slot_starts]) == 0
+
+    resources = {}
+    for day_i, slot_i in zip(*cabinet_free.any(axis=0).nonzero()):
+        resources[(days[day_i], time_slots[slot_i][0])] = [
+            cabinet_ids[c] for c in cabinet_free[:, day_i, slot_i].nonzero()[0]
+        ]
+
+    group_slots = {}
+    for g in groups:
+        group_slots[g.id] = [
+            (days[day_i], time_slots[slot_i][0])
+            for day_i, slot_i in zip(*group_free[group_index[g.id]].nonzero())
+            if (days[day_i], time_slots[slot_i][0]) in resources
+        ]
+
+    return resources, group_slots
+
+
+def get_cabinet_utilization(
+    cabinet_ids: List[int],
+    group_schedules: List[GroupScheduleSchema],
+    days: List[date],
+    schedule_start_time: time,
+    schedule_end_time: time,
+) -> Dict[int, float]:
+    day_set = set(days)
+    window_start, window_end = to_minutes(schedule_start_time), to_minutes(schedule_end_time)
+    available = len(days) * max(window_end - window_start, 0)
+
+    booked = defaultdict(int)
+    for s in group_schedules:
+        if s.date in day_set:
+            booked[s.cabinet_id] += max(
+                min(to_minutes(s.end_time), window_end) - max(to_minutes(s.start_time), window_start), 0
+            )
+
+    return {cab: round(booked[cab] / available, 4) if available else 0.0 for cab in cabinet_ids}
+
+
+# Plans theory lessons of many groups (e.g. a new intake) against all cabinets in one model per lesson
+# duration, so cabinets are shared between groups instead of being taken by the first groups planned.
+# Groups with different lesson durations cannot share a slot grid: duration classes are solved one
+# after another, the longest first, every class sees the lessons planned for the previous ones
+def generate_school_group_schedule(
+    groups: List[GroupForScheduleSchema],
+    schedule_counts: Dict[int, int],
+    schedule_durations: Dict[int, time],
+    cabinet_ids: List[int],
+    existing_group_schedules: List[ExistingGroupScheduleSchema],
+    existing_practice_schedules: List[ExistingPracticeScheduleSchema],
+    start_date: date = date.today() + timedelta(days=1),
+    end_date: date = date.today() + timedelta(days=30),
+    schedule_start_time: time = time(8, 0),
+    schedule_end_time: time = time(18, 0),
+    schedules_per_day=3,
+    include_weekends: bool = False,
+    engine: str | None = None,
+    allow_partial: bool = False,
+):
+    started = timer.perf_counter()
+    days = generate_days(start_date, end_date, include_weekends)
+    instructors = {g.id: g.instructor_id for g in groups}
+
+    groups_by_duration = defaultdict(list)
+    for g in groups:
+        groups_by_duration[schedule_durations[g.id]].append(g)
+
+    # Classes (groups with one lesson duration) are solved one after another, lessons of a class
+    # block cabinets and instructors for the next ones. Returns the plan, statistics per class
+    # and the schedules with the planned lessons
+    def solve_classes(durations: List[time]):
+        planned_schedules = list(existing_group_schedules)
+        result_list = []
+        class_statistics = []
+
+        for schedule_duration in durations:
+            duration_groups = groups_by_duration[schedule_duration]
+            duration_delta = timedelta(hours=schedule_duration.hour, minutes=schedule_duration.minute)
+            time_slots = generate_time_slots(schedule_start_time, schedule_end_time, duration_delta)
+
+            resources, group_slots = build_joint_occupancy_mask(
+                groups=duration_groups,
+                cabinet_ids=cabinet_ids,
+                existing_group_schedules=planned_schedules,
+                existing_practice_schedules=existing_practice_schedules,
+                days=days,
+                time_slots=time_slots,
+            )
+
+            assignments, statistics = solve_joint_availability(
+                resources=resources,
+                student_slots=group_slots,
+                instructors={g.id: g.instructor_id for g in duration_groups},
+                demands={g.id: schedule_counts[g.id] for g in duration_groups},
+                schedules_per_day=schedules_per_day,
+                end_date=end_date,
+                slots_per_day=len(time_slots),
+                include_weekends=include_weekends,
+                engine=engine,
+                allow_partial=True,
+            )
+            class_statistics.append(statistics)
+
+            for group_id, d, start, cab in sorted(assignments, key=lambda a: (a[1], a[2], a[0])):
+                end = (datetime.combine(d, start) + duration_delta).time()
+                schedule = GroupScheduleSchema(
+                    date=d, start_time=start, end_time=end, group_id=group_id, cabinet_id=cab
+                )
+                result_list.append(schedule)
+                planned_schedules.append(ExistingGroupScheduleSchema(
+                    **schedule.model_dump(), instructor_id=instructors[group_id]
+                ))
+        return result_list, class_statistics, planned_schedules
+
+    # Longest lessons first; when groups stay incomplete every other class is tried first once
+    # and the plan with the most lessons is kept
+    durations = sorted(groups_by_duration, reverse=True)
+    result_list, class_statistics, planned_schedules = solve_classes(durations)
+    for duration in durations[1:]:
+        if not any(s.incomplete_ids for s in class_statistics):
+            break
+        plan = solve_classes([duration] + [d for d in durations if d != duration])
+        if len(plan[0]) > len(result_list):
+            result_list, class_statistics, planned_schedules = plan
+
+    total_seconds = timer.perf_counter() - started
+    incomplete_ids = sorted(i for s in class_statistics for i in s.incomplete_ids or ())
+    scheduled_groups_count = len(groups) - len(incomplete_ids)
+    cabinet_utilization = get_cabinet_utilization(
+        cabinet_ids, planned_schedules, days, schedule_start_time, schedule_end_time
+    )
+    suggested_end_dates = [s.suggested_end_date for s in class_statistics if s.suggested_end_date]
+    # Every class is solved on its own, so a short plan over several classes is not proven optimal
+    statuses = {s.status for s in class_statistics}
+    if len(class_statistics) > 1 and incomplete_ids and statuses == {"optimal"}:
+        statuses = {"feasible"}
+    extensions = [s.min_extension_days for s in class_statistics if s.min_extension_days]
+
+    statistics = SchoolTimetableStatisticsSchema(
+        engine=class_statistics[0].engine if class_statistics else "",
+        status=(
+            "no_solution" if "no_solution" in statuses
+            else "feasible" if "feasible" in statuses
+            else "optimal"
+        ),
+        requested_count=sum(s.requested_count for s in class_statistics),
+        generated_count=sum(s.generated_count for s in class_statistics),
+        candidate_slots_count=sum(s.candidate_slots_count for s in class_statistics),
+        solve_seconds=round(sum(s.solve_seconds for s in class_statistics), 4),
+        min_extension_days=max(extensions) if extensions else None,
+        suggested_end_date=max(suggested_end_dates) if suggested_end_dates else None,
+        incomplete_ids=incomplete_ids,
+        groups_count=len(groups),
+        scheduled_groups_count=scheduled_groups_count,
+        total_seconds=round(total_seconds, 4),
+        groups_per_second=round(scheduled_groups_count / total_seconds, 2) if total_seconds else 0.0,
+        cabinet_utilization=cabinet_utilization,
+        average_cabinet_utilization=(
+            round(sum(cabinet_utilization.values()) / len(cabinet_utilization), 4) if cabinet_utilization else 0.0
+        ),
+    )
 
-    for (group_id, d, start, cab), var in schedule_vars.items():
-        if var.value() == 1:
-            end = (datetime.combine(d, start) + duration_delta).time()
-            result_list.append(GroupScheduleSchema(
-                date=d, start_time=start, end_time=end, group_id=group_id, cabinet_id=cab
-            ))
+    if statistics.generated_count < statistics.requested_count and not allow_partial:
+        hint = (f'end date should be at least {statistics.suggested_end_date}'
+                if statistics.suggested_end_date else 'try more schedules per day')
+        raise ScheduleGenerationError(
+            f'Not all schedules can be generated (only {statistics.generated_count}/'
+            f'{statistics.requested_count}, {len(incomplete_ids)} groups incomplete), {hint}',
+            statistics,
+        )
 
-    return result_list
+    return result_list, statistics
@@ -1,8 +1,9 @@
 from datetime import date, timedelta, time, datetime
-from pulp import LpProblem, LpVariable, LpBinary, lpSum, LpMaximize, PULP_CBC_CMD
-from typing import List
+from typing import Dict, List
 from collections import defaultdict
 
+from schedule_generators.common import generate_days, generate_time_slots, solve_availability, \
+    solve_joint_availability
 from core.schemas.group_schedule import ExistingGroupScheduleSchema
 from core.schemas.practice_schedule import PracticeScheduleSchema, StudentForScheduleSchema, \
     ExistingPracticeScheduleSchema
@@ -12,6 +13,51 @@ def has_time_conflict(start1, end1, start2, end2):
     return start1 < end2 and start2 < end1
 
 
+def is_busy(intervals, start, end):
+    return any(has_time_conflict(busy_start, busy_end, start, end) for busy_start, busy_end in intervals)
+
+
+# Resolves conflicts with existing schedules before the model is built:
+# returns free vehicle ids for every (day, slot start) where the student and instructor are free
+def build_availability_mask(
+    student: StudentForScheduleSchema,
+    vehicle_ids: List[int],
+    existing_group_schedules: List[ExistingGroupScheduleSchema],
+    existing_practice_schedules: List[ExistingPracticeScheduleSchema],
+    days: List[date],
+    time_slots: List[tuple[time, time]],
+):
+    student_busy = defaultdict(list)
+    instructor_busy = defaultdict(list)
+    vehicle_busy = defaultdict(list)
+
+    for s in existing_group_schedules:
+        if s.instructor_id == student.instructor_id:
+            instructor_busy[s.date].append((s.start_time, s.end_time))
+
+    for p in existing_practice_schedules:
+        if p.student_id == student.id:
+            student_busy[p.date].append((p.start_time, p.end_time))
+        if p.instructor_id == student.instructor_id:
+            instructor_busy[p.date].append((p.start_time, p.end_time))
+        vehicle_busy[(p.vehicle_id, p.date)].append((p.start_time, p.end_time))
+
+    availability = {}
+    for d in days:
+        for start, end in time_slots:
+            if is_busy(student_busy.get(d, ()), start, end) or is_busy(instructor_busy.get(d, ()), start, end):
+                continue
+
+            free_vehicle_ids = [
+                vec for vec in vehicle_ids
+                if not is_busy(vehicle_busy.get((vec, d), ()), start, end)
+            ]
+            if free_vehicle_ids:
+                availability[(d, start)] = free_vehicle_ids
+
+    return availability
+
+
 def generate_practice_schedule(
     student: StudentForScheduleSchema,
     vehicle_ids: List[int],
@@ -25,112 +71,147 @@ def generate_practice_schedule(
     schedule_count=20,
     schedules_per_day=1,
     include_weekends: bool = False,
+    engine: str | None = None,
+    allow_partial: bool = False,
 ):
-    # Days generation
-    days = []
-    current_day = start_date
-    while current_day <= end_date:
-        if include_weekends or current_day.weekday() < 5:
-            days.append(current_day)
-        current_day += timedelta(days=1)
-
-    # Time slots generation
+    days = generate_days(start_date, end_date, include_weekends)
     duration_delta = timedelta(hours=schedule_duration.hour, minutes=schedule_duration.minute)
-    time_slots = []
-    current_slot_start = datetime.combine(date.today(), schedule_start_time)
-    end_limit = datetime.combine(date.today(), schedule_end_time)
+    time_slots = generate_time_slots(schedule_start_time, schedule_end_time, duration_delta)
+
+    availability = build_availability_mask(
+        student=student,
+        vehicle_ids=vehicle_ids,
+        existing_group_schedules=existing_group_schedules,
+        existing_practice_schedules=existing_practice_schedules,
+        days=days,
+        time_slots=time_slots,
+    )
+
+    assignments, statistics = solve_availability(
+        availability=availability,
+        schedule_count=schedule_count,
+        schedules_per_day=schedules_per_day,
+        end_date=end_date,
+        slots_per_day=len(time_slots),
+        include_weekends=include_weekends,
+        engine=engine,
+        allow_partial=allow_partial,
+    )
 
-    while current_slot_start + duration_delta <= end_limit:
-        slot_start = current_slot_start.time()
-        slot_end = (current_slot_start + duration_delta).time()
-        time_slots.append((slot_start, slot_end))
-        current_slot_start += duration_delta
-
-    # Grouping existing schedules
-    student_schedule_map = defaultdict(list)
-    instructor_schedule_map = defaultdict(list)
-    vehicle_schedule_map = defaultdict(list)
-
-    for s in existing_group_schedules:
-        instructor_schedule_map[s.instructor_id].append(s)
+    result_list = []
 
-    practical_schedule_map = defaultdict(list)
-    for p in existing_practice_schedules:
-        student_schedule_map[p.student_id].append(p)
-        practical_schedule_map[p.instructor_id].append(p)
-        vehicle_schedule_map[p.vehicle_id].append(p)
+    for d, start, vec in assignments:
+        end = (datetime.combine(d, start) + duration_delta).time()
+        result_list.append(PracticeScheduleSchema(
+            date=d, start_time=start, end_time=end, student_id=student.id,
+            vehicle_id=vec, instructor_id=student.instructor_id
+        ))
 
-    schedule_vars = {}
-    prob = LpProblem("GroupScheduleGeneration", LpMaximize)
+    return result_list, statistics
 
-    for d in days:
-        for start, end in time_slots:
-            for vec in vehicle_ids:
-                key = (student.id, d, start, vec)
-                schedule_vars[key] = LpVariable(f"x_{student.id}_{d}_{start}_{vec}", cat=LpBinary)
 
-    prob += lpSum(schedule_vars.values())
+# Same as build_availability_mask for several students at once: returns free vehicle ids
+# for every (day, slot start) and, per student, the slots where the student and their instructor are free
+def build_joint_availability_mask(
+    students: List[StudentForScheduleSchema],
+    vehicle_ids: List[int],
+    existing_group_schedules: List[ExistingGroupScheduleSchema],
+    existing_practice_schedules: List[ExistingPracticeScheduleSchema],
+    days: List[date],
+    time_slots: List[tuple[time, time]],
+):
+    student_ids = {st.id for st in students}
+    instructor_ids = {st.instructor_id for st in students}
+    student_busy = defaultdict(list)
+    instructor_busy = defaultdict(list)
+    vehicle_busy = defaultdict(list)
 
-    # 1. Constraint schedules count per day
-    for d in days:
-        prob += (lpSum(schedule_vars[(student.id, d, start, vec)] for start, _ in time_slots
-                for vec in vehicle_ids) <= schedules_per_day)
+    for s in existing_group_schedules:
+        if s.instructor_id in instructor_ids:
+            instructor_busy[(s.instructor_id, s.date)].append((s.start_time, s.end_time))
 
-    # 2. Constraint total schedules count for student
-    prob += lpSum(schedule_vars[(student.id, d, start, vec)] for d in days for start, _ in time_slots
-                for vec in vehicle_ids) <= schedule_count
+    for p in existing_practice_schedules:
+        if p.student_id in student_ids:
+            student_busy[(p.student_id, p.date)].append((p.start_time, p.end_time))
+        if p.instructor_id in instructor_ids:
+            instructor_busy[(p.instructor_id, p.date)].append((p.start_time, p.end_time))
+        vehicle_busy[(p.vehicle_id, p.date)].append((p.start_time, p.end_time))
 
-    # 3. Conflicts with existing schedules
+    resources = {}
     for d in days:
         for start, end in time_slots:
-            for vec in vehicle_ids:
-                key = (student.id, d, start, vec)
-
-                # Student schedules conflict
-                for p in student_schedule_map[student.id]:
-                    if p.date == d and has_time_conflict(p.start_time, p.end_time, start, end):
-                        prob += schedule_vars[key] == 0
-
-                # Instructor schedules conflict
-                for s in instructor_schedule_map[student.instructor_id]:
-                    if s.date == d and has_time_conflict(s.start_time, s.end_time, start, end):
-                        prob += schedule_vars[key] == 0
-
-                # Vehicle schedules conflict
-                for p in vehicle_schedule_map[vec]:
-                    if p.date == d and has_time_conflict(p.start_time, p.end_time, start, end):
-                        prob += schedule_vars[key] == 0
-
-                # Instructor practice schedules conflict
-                for p in practical_schedule_map[student.instructor_id]:
-                    if p.date == d and has_time_conflict(p.start_time, p.end_time, start, end):
-                        prob += schedule_vars[key] == 0
-
-    # 4. Constraint student cannot be in multiple vehicles at the same time
-    for d in days:
-        for start, _ in time_slots:
-            prob += lpSum(
-                schedule_vars[(student.id, d, start, vec)]
-                for vec in vehicle_ids
-                if (student.id, d, start, vec) in schedule_vars
-            ) <= 1
-
-    prob.solve(PULP_CBC_CMD(msg=0))
-
-    count = float(str(lpSum([v.value() for v in schedule_vars.values()])))
-
-    if count < schedule_count:
-        raise Exception(f'Not all schedules can be generated (only {count}/{schedule_count}), '
-                        f'try wider date range or more schedules per day')
+            free_vehicle_ids = [
+                vec for vec in vehicle_ids
+                if not is_busy(vehicle_busy.get((vec, d), ()), start, end)
+            ]
+            if free_vehicle_ids:
+                resources[(d, start)] = free_vehicle_ids
+
+    slot_ends = dict(time_slots)
+    student_slots = {}
+    for st in students:
+        student_slots[st.id] = [
+            (d, start) for d, start in resources
+            if not is_busy(student_busy.get((st.id, d), ()), start, slot_ends[start])
+            and not is_busy(instructor_busy.get((st.instructor_id, d), ()), start, slot_ends[start])
+        ]
+
+    return resources, student_slots
+
+
+# Plans practice lessons of several students (e.g. a whole group) in one model,
+# so vehicles and instructors are shared fairly instead of first come, first served
+def generate_joint_practice_schedule(
+    students: List[StudentForScheduleSchema],
+    schedule_counts: Dict[int, int],
+    vehicle_ids: List[int],
+    existing_group_schedules: List[ExistingGroupScheduleSchema],
+    existing_practice_schedules: List[ExistingPracticeScheduleSchema],
+    start_date: date = date.today() + timedelta(days=1),
+    end_date: date = date.today() + timedelta(days=30),
+    schedule_start_time: time = time(8, 0),
+    schedule_end_time: time = time(18, 0),
+    schedule_duration: time = time(2, 0),
+    schedules_per_day=1,
+    include_weekends: bool = False,
+    engine: str | None = None,
+    allow_partial: bool = False,
+):
+    days = generate_days(start_date, end_date, include_weekends)
+    duration_delta = timedelta(hours=schedule_duration.hour, minutes=schedule_duration.minute)
+    time_slots = generate_time_slots(schedule_start_time, schedule_end_time, duration_delta)
+
+    resources, student_slots = build_joint_availability_mask(
+        students=students,
+        vehicle_ids=vehicle_ids,
+        existing_group_schedules=existing_group_schedules,
+        existing_practice_schedules=existing_practice_schedules,
+        days=days,
+        time_slots=time_slots,
+    )
+
+    instructors = {st.id: st.instructor_id for st in students}
+
+    assignments, statistics = solve_joint_availability(
+        resources=resources,
+        student_slots=student_slots,
+        instructors=instructors,
+        demands={st.id: schedule_counts[st.id] for st in students},
+        schedules_per_day=schedules_per_day,
+        end_date=end_date,
+        slots_per_day=len(time_slots),
+        include_weekends=include_weekends,
+        engine=engine,
+        allow_partial=allow_partial,
+    )
 
     result_list = []
 
-    for (student_id, d, start, vec), var in schedule_vars.items():
-        if var.value() == 1:
-            end = (datetime.combine(d, start) + duration_delta).time()
-            result_list.append(PracticeScheduleSchema(
-                date=d, start_time=start, end_time=end, student_id=student_id,
-                vehicle_id=vec, instructor_id=student.instructor_id
-            ))
+    for student_id, d, start, vec in sorted(assignments, key=lambda a: (a[1], a[2], a[0])):
+        end = (datetime.combine(d, start) + duration_delta).time()
+        result_list.append(PracticeScheduleSchema(
+            date=d, start_time=start, end_time=end, student_id=student_id,
+            vehicle_id=vec, instructor_id=instructors[student_id]
+        ))
 
-    return result_list
+    return result_list, statistics
@@ -0,0 +1,87 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import suppress
+from typing import Awaitable, Callable
+
+from core.config import settings
+from schedule_generators.engines import set_solve_deadline
+
+CancelCheck = Callable[[], Awaitable[bool]]
+
+_executor: ProcessPoolExecutor | None = None
+_solves_semaphore = asyncio.Semaphore(settings.scheduling.max_concurrent_solves)
+
+
+def get_solver_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.scheduling.process_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_solver_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+# Runs in the solver process: every solve of the generator shares one time limit
+def _run_with_deadline(generator: Callable, time_limit: int, kwargs: dict):
+    set_solve_deadline(time.monotonic() + time_limit)
+    try:
+        return generator(**kwargs)
+    finally:
+        set_solve_deadline(None)
+
+
+def _release_solve_slot(loop: asyncio.AbstractEventLoop):
+    with suppress(RuntimeError):  # the loop is already closed on shutdown
+        loop.call_soon_threadsafe(_solves_semaphore.release)
+
+
+# Runs a schedule generator in the solver process pool, so the event loop is not blocked.
+# The solver gets time_limit seconds and returns its best plan found by then; the runner waits
+# time_limit_grace seconds more for the result. It stops waiting earlier when cancel_check() reports
+# that the client has gone. A solve that already started can not be cancelled: its slot stays taken
+# until the worker process is free again, so abandoned solves never pile up on busy processes
+async def run_generator(
+    generator: Callable,
+    cancel_check: CancelCheck | None = None,
+    **kwargs,
+):
+    loop = asyncio.get_running_loop()
+    time_limit = settings.scheduling.time_limit
+
+    await _solves_semaphore.acquire()
+    try:
+        future = get_solver_executor().submit(_run_with_deadline, generator, time_limit, kwargs)
+    except BaseException:
+        _solves_semaphore.release()
+        raise
+    future.add_done_callback(lambda _: _release_solve_slot(loop))
+
+    # max_concurrent_solves <= process_workers: the solve starts right away, the deadline starts with it
+    result = asyncio.wrap_future(future)
+    # An abandoned result is never read, do not log it as a lost exception
+    result.add_done_callback(lambda f: f.cancelled() or f.exception())
+    deadline = loop.time() + time_limit + settings.scheduling.time_limit_grace
+
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            future.cancel()
+            raise Exception(f"Schedule generation exceeded the time limit ({time_limit} s)")
+
+        done, _ = await asyncio.wait({result}, timeout=min(remaining, settings.scheduling.cancel_poll_interval))
+        if done:
+            return result.result()
+
+        if cancel_check and await cancel_check():
+            future.cancel()
+            raise Exception("Schedule generation cancelled: client disconnected")
@@ -0,0 +1,219 @@
+import asyncio
+import importlib.util
+import os
+import unittest
+import uuid
+from datetime import date, time
+from pathlib import Path
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from core.models import User, Instructor, Student, Vehicle, Cabinet, CategoryLevel, Group, GroupSchedule, \
+    PracticeSchedule
+from core.schemas.group_schedule import GroupScheduleSchema
+from core.schemas.practice_schedule import PracticeScheduleSchema
+from crud.group_schedule import SCHEDULE_CONFLICT_MESSAGES as GROUP_CONFLICT_MESSAGES
+from crud.practice_schedule import SCHEDULE_CONFLICT_MESSAGES as PRACTICE_CONFLICT_MESSAGES
+from crud.schedule_persistence import bulk_insert_schedules, raise_schedule_conflict
+
+MIGRATIONS_DIR = Path(__file__).parent.parent / "alembic" / "versions"
+
+# Migrated database (alembic upgrade head) the concurrency tests may write to, they are skipped without it
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+class DriverError(Exception):
+    # asyncpg exceptions carry the name of the violated constraint
+    def __init__(self, message: str, constraint_name: str | None = None):
+        super().__init__(message)
+        self.constraint_name = constraint_name
+
+
+def make_integrity_error(constraint_name: str | None, message: str = "") -> IntegrityError:
+    orig = Exception(message)
+    orig.__cause__ = DriverError(message, constraint_name)
+    return IntegrityError("INSERT", {}, orig)
+
+
+def load_exclusion_constraints() -> set[str]:
+    path = next(MIGRATIONS_DIR.glob("*-c5d8a1f7e294_*.py"))
+    spec = importlib.util.spec_from_file_location("schedule_time_range_migration", path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    return {f"ex_{table_name}_{column_name}" for table_name, column_name in migration.EXCLUSION_CONSTRAINTS}
+
+
+class ScheduleConflictMessagesTestCase(unittest.TestCase):
+    def test_every_exclusion_constraint_has_message(self):
+        self.assertEqual(
+            load_exclusion_constraints(),
+            set(PRACTICE_CONFLICT_MESSAGES) | set(GROUP_CONFLICT_MESSAGES),
+        )
+
+    def test_constraint_mapped_to_message(self):
+        for messages in (PRACTICE_CONFLICT_MESSAGES, GROUP_CONFLICT_MESSAGES):
+            for constraint_name, message in messages.items():
+                with self.subTest(constraint_name=constraint_name):
+                    with self.assertRaises(HTTPException) as raised:
+                        raise_schedule_conflict(make_integrity_error(constraint_name), messages)
+                    self.assertEqual(raised.exception.status_code, 400)
+                    self.assertEqual(raised.exception.detail, message)
+
+    def test_constraint_name_read_from_message(self):
+        error = IntegrityError(
+            "INSERT", {},
+            Exception('conflicting key value violates exclusion constraint "ex_group_schedule_cabinet_id"'),
+        )
+        with self.assertRaises(HTTPException) as raised:
+            raise_schedule_conflict(error, GROUP_CONFLICT_MESSAGES)
+        self.assertEqual(raised.exception.detail, GROUP_CONFLICT_MESSAGES["ex_group_schedule_cabinet_id"])
+
+    def test_other_violation_raised_as_is(self):
+        error = make_integrity_error("fk_group_schedule_group_id_group")
+        with self.assertRaises(IntegrityError) as raised:
+            raise_schedule_conflict(error, GROUP_CONFLICT_MESSAGES)
+        self.assertIs(raised.exception, error)
+
+
+# Two lessons for one instructor, vehicle or cabinet inserted at the same time on two connections:
+# the exclusion constraint lets exactly one of them in, the other one gets the conflict message
+@unittest.skipUnless(TEST_DATABASE_URL, "TEST_DATABASE_URL is not set")
+class ScheduleConflictConcurrencyTestCase(unittest.IsolatedAsyncioTestCase):
+    lesson_date = date(2100, 1, 4)
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine(TEST_DATABASE_URL)
+        self.session_factory = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+        suffix = uuid.uuid4().hex[:8]
+
+        async with self.session_factory() as session:
+            self.category_level = CategoryLevel(category=suffix, transmission="test", description="test")
+            self.cabinet = Cabinet(name=f"test_{suffix}")
+            session.add_all([self.category_level, self.cabinet])
+            await session.flush()
+
+            self.users = [
+                User(
+                    username=f"test_{suffix}_{i}",
+                    hashed_password="-",
+                    first_name="Test",
+                    last_name="Test",
+                    birthday=date(2000, 1, 1),
+                    phone_number=f"{suffix}{i}",
+                )
+                for i in range(4)
+            ]
+            session.add_all(self.users)
+            await session.flush()
+
+            self.groups = [
+                Group(name=f"test_{suffix}_{i}", created_date=date.today(), category_level_id=self.category_level.id)
+                for i in range(2)
+            ]
+            self.instructors = [Instructor(id=user.id, work_started_date=date.today()) for user in self.users[:2]]
+            self.vehicles = [
+                Vehicle(
+                    brand="Test",
+                    model="Test",
+                    manufacture_year=2020,
+                    license_plate=f"test_{suffix}_{i}",
+                    fuel_type="petrol",
+                    category_level_id=self.category_level.id,
+                )
+                for i in range(2)
+            ]
+            session.add_all(self.groups + self.instructors + self.vehicles)
+            await session.flush()
+
+            self.students = [
+                Student(id=user.id, category_level_id=self.category_level.id, group_id=self.groups[0].id)
+                for user in self.users[2:]
+            ]
+            session.add_all(self.students)
+            await session.commit()
+
+    async def asyncTearDown(self):
+        # Lessons, groups, vehicles, instructors and students are removed by the cascades
+        async with self.session_factory() as session:
+            await session.execute(delete(User).where(User.id.in_([user.id for user in self.users])))
+            await session.execute(delete(CategoryLevel).where(CategoryLevel.id == self.category_level.id))
+            await session.execute(delete(Cabinet).where(Cabinet.id == self.cabinet.id))
+            await session.commit()
+        await self.engine.dispose()
+
+    async def insert_concurrently(self, model, lessons, conflict_messages):
+        async def insert(lesson):
+            async with self.session_factory() as session:
+                return await bulk_insert_schedules(session, model, [lesson], conflict_messages)
+
+        results = await asyncio.gather(*(insert(lesson) for lesson in lessons), return_exceptions=True)
+        inserted = [result for result in results if isinstance(result, list)]
+        conflicts = [result for result in results if isinstance(result, HTTPException)]
+        self.assertEqual(len(inserted), 1, results)
+        self.assertEqual(len(conflicts), 1, results)
+        self.assertEqual(conflicts[0].status_code, 400)
+        return conflicts[0].detail
+
+    async def count_lessons(self, model, *where) -> int:
+        async with self.session_factory() as session:
+            return await session.scalar(select(func.count()).select_from(model).where(*where))
+
+    def practice_lesson(self, instructor: Instructor, vehicle: Vehicle, student: Student, start_time: time):
+        return PracticeScheduleSchema(
+            date=self.lesson_date,
+            start_time=start_time,
+            end_time=time(start_time.hour + 2, start_time.minute),
+            instructor_id=instructor.id,
+            vehicle_id=vehicle.id,
+            student_id=student.id,
+        )
+
+    async def test_same_instructor(self):
+        detail = await self.insert_concurrently(
+            PracticeSchedule,
+            [
+                self.practice_lesson(self.instructors[0], self.vehicles[0], self.students[0], time(10, 0)),
+                self.practice_lesson(self.instructors[0], self.vehicles[1], self.students[1], time(11, 0)),
+            ],
+            PRACTICE_CONFLICT_MESSAGES,
+        )
+        self.assertEqual(detail, PRACTICE_CONFLICT_MESSAGES["ex_practice_schedule_instructor_id"])
+        self.assertEqual(
+            await self.count_lessons(PracticeSchedule, PracticeSchedule.instructor_id == self.instructors[0].id), 1
+        )
+
+    async def test_same_vehicle(self):
+        detail = await self.insert_concurrently(
+            PracticeSchedule,
+            [
+                self.practice_lesson(self.instructors[0], self.vehicles[0], self.students[0], time(10, 0)),
+                self.practice_lesson(self.instructors[1], self.vehicles[0], self.students[1], time(11, 0)),
+            ],
+            PRACTICE_CONFLICT_MESSAGES,
+        )
+        self.assertEqual(detail, PRACTICE_CONFLICT_MESSAGES["ex_practice_schedule_vehicle_id"])
+        self.assertEqual(
+            await self.count_lessons(PracticeSchedule, PracticeSchedule.vehicle_id == self.vehicles[0].id), 1
+        )
+
+    async def test_same_cabinet(self):
+        detail = await self.insert_concurrently(
+            GroupSchedule,
+            [
+                GroupScheduleSchema(
+                    date=self.lesson_date, start_time=time(10, 0), end_time=time(12, 0),
+                    group_id=group.id, cabinet_id=self.cabinet.id,
+                )
+                for group in self.groups
+            ],
+            GROUP_CONFLICT_MESSAGES,
+        )
+        self.assertEqual(detail, GROUP_CONFLICT_MESSAGES["ex_group_schedule_cabinet_id"])
+        self.assertEqual(await self.count_lessons(GroupSchedule, GroupSchedule.cabinet_id == self.cabinet.id), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import random
+import unittest
+from collections import defaultdict
+from datetime import date, time, timedelta
+
+from schedule_generators.engines import CombinatorialEngine, PulpEngine
+
+
+def cbc_available() -> bool:
+    try:
+        from pulp import PULP_CBC_CMD
+        return PULP_CBC_CMD().available()
+    except ImportError:
+        return False
+
+
+def random_availability(rng: random.Random):
+    start = date(2026, 1, 5)
+    days = [start + timedelta(days=i) for i in range(rng.randint(1, 6))]
+    slots = [time(hour) for hour in range(8, 8 + rng.randint(1, 5))]
+    return {(d, s): rng.sample(range(1, 5), rng.randint(0, 3)) for d in days for s in slots}
+
+
+# Random instances compared with the MILP solved by CBC: both engines must plan the same number of lessons
+@unittest.skipUnless(cbc_available(), "CBC solver is not available")
+class CombinatorialEngineTestCase(unittest.TestCase):
+    instances = 200
+
+    def setUp(self):
+        self.combinatorial = CombinatorialEngine()
+        self.pulp = PulpEngine()
+
+    def check_plan(self, plan, availability, schedule_count, schedules_per_day):
+        per_day = defaultdict(int)
+        for d, start, resource_id in plan:
+            self.assertIn(resource_id, availability[(d, start)])
+            per_day[d] += 1
+        self.assertEqual(len(plan), len({(d, start) for d, start, _ in plan}))
+        self.assertLessEqual(len(plan), schedule_count)
+        self.assertTrue(all(count <= schedules_per_day for count in per_day.values()))
+
+    def check_joint_plan(self, plan, resources, student_slots, instructors, demands, schedules_per_day):
+        used_resources = set()
+        busy_instructors = set()
+        per_student = defaultdict(int)
+        per_day = defaultdict(int)
+        for student_id, d, start, resource_id in plan:
+            self.assertIn((d, start), student_slots[student_id])
+            self.assertIn(resource_id, resources[(d, start)])
+            self.assertNotIn((d, start, resource_id), used_resources)
+            self.assertNotIn((instructors[student_id], d, start), busy_instructors)
+            used_resources.add((d, start, resource_id))
+            busy_instructors.add((instructors[student_id], d, start))
+            per_student[student_id] += 1
+            per_day[(student_id, d)] += 1
+        self.assertTrue(all(per_student[s] <= demand for s, demand in demands.items()))
+        self.assertTrue(all(count <= schedules_per_day for count in per_day.values()))
+
+    def test_solve_matches_pulp(self):
+        rng = random.Random(12)
+        for _ in range(self.instances):
+            availability = random_availability(rng)
+            schedule_count = rng.randint(1, 12)
+            schedules_per_day = rng.randint(1, 3)
+
+            plan, status = self.combinatorial.solve(availability, schedule_count, schedules_per_day)
+            expected, expected_status = self.pulp.solve(availability, schedule_count, schedules_per_day)
+
+            self.check_plan(plan, availability, schedule_count, schedules_per_day)
+            self.assertEqual(status, "optimal")
+            self.assertEqual(expected_status, "optimal")
+            self.assertEqual(len(plan), len(expected))
+
+    def test_solve_joint_matches_pulp(self):
+        rng = random.Random(7)
+        for _ in range(self.instances):
+            resources = random_availability(rng)
+            students = range(1, rng.randint(2, 9))
+            instructors = {s: rng.randint(1, 3) for s in students}
+            student_slots = {s: rng.sample(list(resources), rng.randint(0, len(resources))) for s in students}
+            demands = {s: rng.randint(1, 6) for s in students}
+            schedules_per_day = rng.randint(1, 3)
+            args = (resources, student_slots, instructors, demands, schedules_per_day)
+
+            plan, status = self.combinatorial.solve_joint(*args)
+            expected, expected_status = self.pulp.solve_joint(*args)
+
+            self.check_joint_plan(plan, *args)
+            self.assertEqual(status, "optimal")
+            self.assertEqual(expected_status, "optimal")
+            self.assertEqual(len(plan), len(expected))
+
+    # Chronological filling gives the only common slot to the first student and leaves the second one out
+    def test_solve_joint_beyond_greedy(self):
+        d = date(2026, 1, 5)
+        resources = {(d, time(8)): [1], (d, time(10)): [1]}
+        student_slots = {1: [(d, time(8)), (d, time(10))], 2: [(d, time(8))]}
+
+        plan, status = self.combinatorial.solve_joint(resources, student_slots, {1: 1, 2: 2}, {1: 1, 2: 1}, 3)
+
+        self.assertEqual(status, "optimal")
+        self.assertEqual(sorted(plan), [(1, d, time(10), 1), (2, d, time(8), 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import asyncio
+import time
+from contextlib import AsyncExitStack
+from datetime import date
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import configure_mappers
+
+from core.config import settings
+from core.models import db_helper
+from crud.cabinet import get_all_cabinets
+from crud.category_level import get_all_category_levels
+from crud.group import get_groups_paginated
+from crud.group_schedule import get_group_schedules_by_student_id_and_date, get_group_schedules_by_instructor_and_date, \
+    get_group_schedules_by_group_and_date
+from crud.instructor import get_instructor_profile, get_instructors_paginated
+from crud.practice_schedule import get_practice_schedules_by_student_id_and_date, \
+    get_practice_schedules_by_instructor_and_date
+from crud.student import get_student_profile, get_students_paginated
+from crud.user import get_user_by_username
+from crud.vehicle import get_vehicles_paginated
+
+
+warmup_state = {
+    "done": False,
+    "error": None,
+    "duration_seconds": None,
+    "steps": {},
+}
+
+
+async def open_pool_connections(count: int):
+    # Connections over the pool limits would only time out waiting for a checkout and fail the warmup
+    count = min(count, db_helper.pool_size + db_helper.max_overflow)
+    async with AsyncExitStack() as stack:
+        connections = await asyncio.gather(*(
+            stack.enter_async_context(db_helper.engine.connect())
+            for _ in range(count)
+        ))
+        for connection in connections:
+            await connection.execute(text("SELECT 1"))
+
+
+async def compile_hot_statements(session: AsyncSession):
+    # Nonexistent ids: statements are compiled and cached by the engine, no rows are loaded
+    missing_id = -1
+    today = date.today()
+
+    await get_user_by_username(session, "")
+
+    await get_group_schedules_by_student_id_and_date(session, missing_id, today)
+    await get_practice_schedules_by_student_id_and_date(session, missing_id, today)
+    await get_group_schedules_by_instructor_and_date(session, missing_id, today)
+    await get_practice_schedules_by_instructor_and_date(session, missing_id, today)
+    await get_group_schedules_by_group_and_date(session, missing_id, today)
+
+    for profile_getter in (get_student_profile, get_instructor_profile):
+        try:
+            await profile_getter(session, missing_id)
+        except HTTPException:
+            pass
+
+    await get_students_paginated(session, search="")
+    await get_instructors_paginated(session, search="")
+    await get_groups_paginated(session, search="")
+    await get_vehicles_paginated(session, search="")
+
+
+async def load_reference_data(session: AsyncSession):
+    await get_all_category_levels(session)
+    await get_all_cabinets(session)
+
+
+async def run_warmup():
+    started = time.perf_counter()
+
+    async def step(name, coro):
+        step_started = time.perf_counter()
+        await coro
+        warmup_state["steps"][name] = round(time.perf_counter() - step_started, 4)
+
+    try:
+        mappers_started = time.perf_counter()
+        configure_mappers()
+        warmup_state["steps"]["configure_mappers"] = round(time.perf_counter() - mappers_started, 4)
+
+        if settings.warmup.pool_connections:
+            await step("open_pool_connections", open_pool_connections(settings.warmup.pool_connections))
+
+        async for session in db_helper.session_getter():
+            if settings.warmup.compile_statements:
+                await step("compile_hot_statements", compile_hot_statements(session))
+            if settings.warmup.load_reference_data:
+                await step("load_reference_data", load_reference_data(session))
+            await session.rollback()
+    except Exception as e:
+        warmup_state["error"] = str(e)
+    finally:
+        warmup_state["duration_seconds"] = round(time.perf_counter() - started, 4)
+        warmup_state["done"] = True